@@ -1,31 +1,155 @@
 # admin page
 
+import json
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, UserProfile, Contact, SpamReport
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from django.utils.html import format_html, format_html_join
+from .models import User, UserProfile, Contact, SpamReport, RequestProfile, QueryFingerprint
+from .search import indexed_filter
+
+# Below this many estimated rows the exact count is cheap enough to run
+EXACT_COUNT_LIMIT = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that takes large result counts from the planner's estimate.
+
+    An exact ``COUNT(*)`` reads every matching row, which on large tables
+    costs more than the page itself. On PostgreSQL the row estimate of
+    ``EXPLAIN`` is used instead once it exceeds ``EXACT_COUNT_LIMIT``.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = self.estimated_count()
+        if estimate is not None and estimate > EXACT_COUNT_LIMIT:
+            return estimate
+        return super().count
+
+    def estimated_count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+class ScalableAdminMixin:
+    """
+    Changelist defaults for tables too large to count or scan.
+
+    Search goes through ``indexed_filter`` with the fields named in
+    ``indexed_search``, so every admin search is an index range scan.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    indexed_search = {}
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(indexed_filter(search_term, **self.indexed_search)), False
+
 
 class UserProfileInline(admin.StackedInline):
     model = UserProfile
     can_delete = False
 
-class CustomUserAdmin(BaseUserAdmin):
+class CustomUserAdmin(ScalableAdminMixin, BaseUserAdmin):
     inlines = (UserProfileInline,)
     list_display = ('username', 'get_phone_number', 'email', 'is_staff')
-    
+    list_select_related = ('profile',)
+    search_fields = ('username', 'name', 'profile__phone_number')
+    indexed_search = {
+        'phone_field': 'profile__phone_reversed',
+        'name_field': 'name_normalized',
+        'prefix_fields': ('username',),
+    }
+
     def get_phone_number(self, obj):
         return obj.profile.phone_number if hasattr(obj, 'profile') else ''
     get_phone_number.short_description = 'Phone Number'
 
 @admin.register(Contact)
-class ContactAdmin(admin.ModelAdmin):
+class ContactAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'phone_number', 'owner', 'spam_reported')
+    list_select_related = ('owner',)
+    raw_id_fields = ('owner',)
     search_fields = ('name', 'phone_number')
+    indexed_search = {'phone_field': 'phone_reversed', 'name_field': 'name_normalized'}
     list_filter = ('spam_reported',)
 
 @admin.register(SpamReport)
-class SpamReportAdmin(admin.ModelAdmin):
+class SpamReportAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('phone_number', 'reporter', 'timestamp')
+    list_select_related = ('reporter',)
+    raw_id_fields = ('reporter',)
     search_fields = ('phone_number',)
+    indexed_search = {'phone_field': 'phone_reversed'}
     list_filter = ('timestamp',)
 
-admin.site.register(User, CustomUserAdmin)
\ No newline at end of file
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created', 'method', 'path', 'status_code', 'duration_ms', 'sql_count', 'sql_ms', 'user')
+    list_select_related = ('user',)
+    list_filter = ('method', 'status_code')
+    search_fields = ('path',)
+    fields = (
+        'created', 'user', 'method', 'path', 'status_code', 'duration_ms', 'sql_count', 'sql_ms',
+        'formatted_queries', 'formatted_call_stats'
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='SQL')
+    def formatted_queries(self, obj):
+        return format_html_join(
+            '', '<p><b>{} ms</b></p><pre>{}</pre><pre>{}</pre>{}',
+            (
+                (query['ms'], query['sql'], ', '.join(query['params']),
+                 format_html('<pre>{}</pre>', query['plan']) if query['plan'] else '')
+                for query in obj.queries
+            )
+        )
+
+    @admin.display(description='Call stats')
+    def formatted_call_stats(self, obj):
+        return format_html('<pre>{}</pre>', obj.call_stats)
+
+@admin.register(QueryFingerprint)
+class QueryFingerprintAdmin(admin.ModelAdmin):
+    list_display = ('sql', 'calls', 'slow_calls', 'total_ms', 'max_ms', 'last_seen')
+    ordering = ('-total_ms',)
+    search_fields = ('sql',)
+    readonly_fields = ('fingerprint', 'sql', 'calls', 'slow_calls', 'total_ms', 'max_ms', 'formatted_plan',
+                       'plan_ms', 'plan_captured_at', 'first_seen', 'last_seen')
+    exclude = ('plan',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Plan')
+    def formatted_plan(self, obj):
+        return format_html('<pre>{}</pre>', obj.plan)
+
+admin.site.register(User, CustomUserAdmin)
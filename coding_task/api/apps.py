@@ -1,5 +1,15 @@
 from django.apps import AppConfig
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'coding_task.api' 
\ No newline at end of file
+    name = 'coding_task.api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .slowlog import get_slowlog_setting, recorder
+
+        if get_slowlog_setting('ENABLED'):
+            connection_created.connect(recorder.install, dispatch_uid='slow_query_log')
+            request_finished.connect(recorder.flush_if_due, dispatch_uid='slow_query_log')
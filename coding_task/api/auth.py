@@ -3,7 +3,7 @@ from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework import exceptions
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
-from rest_framework.throttling import AnonRateThrottle
+from .throttling import AnonRateThrottle
 
 User = get_user_model()
 
@@ -29,6 +29,8 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
             raise exceptions.AuthenticationFailed('User not found')
 
 class LoginThrottle(AnonRateThrottle):
+    # Its own key: a window of another length on the 'anon' key resets it
+    scope = 'login'
     rate = '5/hour'
 
 class CustomTokenObtainPairView(TokenObtainPairView):
@@ -0,0 +1,99 @@
+"""
+Sharded counters for totals that many requests change at once.
+
+A counter that every report on a viral number increments is a single row
+that every one of those transactions has to lock in turn. Here an increment
+goes to one of ``SHARDS`` ``CounterShard`` rows of its key, picked at
+random, so concurrent reports mostly lock different rows. ``compact()``,
+run every few seconds by the ``compact_counters`` command, moves the shard
+values into the total they belong to (a ``UserProfile.spam_count``, a
+``SpamRangeCount``) and zeroes the shards. Readers that cannot wait for it
+add the shards to the total.
+
+Keys are ``'<namespace>:<name>'``; each namespace has its own compaction
+target (see reports.py).
+"""
+import random
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import CounterShard
+
+DEFAULTS = {
+    'SHARDS': 32,
+    # Shard rows moved per compaction transaction
+    'COMPACT_BATCH': 5000,
+}
+
+
+def get_counter_setting(name):
+    return getattr(settings, 'SPAM_COUNTERS', {}).get(name, DEFAULTS[name])
+
+
+def increment(changes):
+    """
+    Add ``{key: delta}`` to the counters, in key order so concurrent callers
+    lock shard rows in the same order. Call inside the caller's transaction.
+    """
+    shards = get_counter_setting('SHARDS')
+    for key in sorted(changes):
+        if changes[key]:
+            _add(key, random.randrange(shards), changes[key])
+
+
+def _add(key, slot, delta):
+    rows = CounterShard.objects.filter(key=key, slot=slot)
+    if rows.update(value=F('value') + delta):
+        return
+    try:
+        with transaction.atomic():
+            CounterShard.objects.create(key=key, slot=slot, value=delta)
+    except IntegrityError:
+        # Another request created the shard first
+        rows.update(value=F('value') + delta)
+
+
+def shard_values(keys):
+    """
+    ``(key, value)`` rows of the shards of ``keys``, still to be added to
+    their totals. A queryset, so readers can ``union()`` it with the totals
+    and read both in one query.
+    """
+    return CounterShard.objects.filter(key__in=keys).values_list('key', 'value')
+
+
+def compact(namespace, apply, batch=None):
+    """
+    Move the shard values of ``namespace`` into their totals.
+
+    ``apply({name: delta})`` writes the totals, in the same transaction that
+    zeroes the shards, so every increment is counted exactly once. Shards
+    locked by an in-flight report are skipped until the next compaction.
+    Returns the number of counters changed.
+    """
+    batch = batch or get_counter_setting('COMPACT_BATCH')
+    prefix = f'{namespace}:'
+    shards = CounterShard.objects.filter(key__startswith=prefix)
+    changed = 0
+    with transaction.atomic():
+        # Zeroed by the previous compaction and not incremented since
+        shards.filter(value=0).delete()
+    while True:
+        with transaction.atomic():
+            rows = list(
+                shards.exclude(value=0).select_for_update(skip_locked=True)
+                .order_by('key', 'slot').values_list('id', 'key', 'value')[:batch]
+            )
+            if not rows:
+                return changed
+            totals = Counter()
+            for _, key, value in rows:
+                totals[key[len(prefix):]] += value
+            CounterShard.objects.filter(id__in=[pk for pk, _, _ in rows]).update(value=0)
+            apply({name: delta for name, delta in totals.items() if delta})
+            changed += len(totals)
+        if len(rows) < batch:
+            return changed
@@ -0,0 +1,83 @@
+import base64
+import binascii
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import SpamReport
+
+DEFAULTS = {
+    'PAGE_SIZE': 500,
+    'MAX_WAIT': 30,
+    'POLL_INTERVAL': 0.5,
+    # Reports younger than this are held back, so one whose transaction
+    # commits after a higher id has been served is not skipped
+    'SETTLE_SECONDS': 2,
+}
+FIELDS = ('id', 'phone_number', 'reporter_id', 'timestamp')
+
+
+def get_feed_setting(name):
+    return getattr(settings, 'SPAM_FEED', {}).get(name, DEFAULTS[name])
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(f'r:{last_id}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return 0
+    try:
+        kind, _, last_id = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().partition(':')
+        if kind == 'r':
+            return int(last_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        pass
+    raise ValidationError({'since': 'Invalid cursor'})
+
+
+def reports_after(last_id, limit):
+    """
+    Up to ``limit`` reports with ids above ``last_id``, oldest first, plus
+    one to detect more. The page ends before the first report still inside
+    the settle window: ids are not committed in order, and the cursor must
+    not pass a report that may be followed by a lower id yet to commit.
+    """
+    settled = timezone.now() - timedelta(seconds=get_feed_setting('SETTLE_SECONDS'))
+    reports = SpamReport.objects.filter(id__gt=last_id)
+    first_unsettled = reports.filter(timestamp__gt=settled).order_by('id').values_list('id', flat=True).first()
+    if first_unsettled is not None:
+        reports = reports.filter(id__lt=first_unsettled)
+    return list(reports.order_by('id').values_list(*FIELDS)[:limit + 1])
+
+
+def read_feed(cursor, wait=0, limit=None):
+    """
+    The page of the report feed after ``cursor``.
+
+    Pages are keyset ranges on the primary key, so a poll costs the new
+    rows only. With ``wait`` seconds and nothing new, the database is
+    re-polled until a report arrives or the wait runs out.
+    """
+    last_id = decode_cursor(cursor)
+    limit = limit or get_feed_setting('PAGE_SIZE')
+    deadline = time.monotonic() + min(wait, get_feed_setting('MAX_WAIT'))
+
+    rows = reports_after(last_id, limit)
+    while not rows and time.monotonic() < deadline:
+        time.sleep(min(get_feed_setting('POLL_INTERVAL'), max(deadline - time.monotonic(), 0)))
+        rows = reports_after(last_id, limit)
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        last_id = rows[-1][0]
+    return {
+        'results': [dict(zip(FIELDS, row)) for row in rows],
+        'cursor': encode_cursor(last_id),
+        'has_more': has_more,
+    }
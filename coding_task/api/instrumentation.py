@@ -0,0 +1,121 @@
+import hashlib
+import re
+import time
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+
+from django.db import connections, transaction
+
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER = re.compile(r'%s|\?|:\w+')
+VALUE_LIST = re.compile(r'\((?:\s*\?\s*,)*\s*\?\s*\)')
+REPEATED_ROWS = re.compile(r'(\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+')
+WHITESPACE = re.compile(r'\s+')
+# PostgreSQL: 'Seq Scan on api_contact'; SQLite: 'SCAN api_contact' (vs 'SEARCH ... USING INDEX')
+SEQ_SCAN = re.compile(r'(?:Seq Scan on|\bSCAN(?: TABLE)?)\s+"?(\w+)"?')
+# PostgreSQL: 'Index Only Scan using ...'; SQLite: '... USING COVERING INDEX ...'
+INDEX_ONLY_SCAN = re.compile(r'Index Only Scan|USING COVERING INDEX')
+
+
+@lru_cache(maxsize=4096)
+def normalize_sql(sql):
+    """
+    SQL with literals and placeholders replaced by '?' and value lists
+    collapsed, so statements differing only in their values compare equal.
+    """
+    sql = STRING_LITERAL.sub('?', sql)
+    sql = PLACEHOLDER.sub('?', sql)
+    sql = NUMBER_LITERAL.sub('?', sql)
+    sql = VALUE_LIST.sub('(...)', sql)
+    sql = REPEATED_ROWS.sub(r'\1', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    """Stable hash of ``normalize_sql(sql)``, with the normalized text."""
+    normalized = normalize_sql(sql)
+    return hashlib.sha1(normalized.encode()).hexdigest(), normalized
+
+
+def seq_scanned_tables(plan):
+    """Tables a query plan reads with a full sequential scan."""
+    return sorted(set(SEQ_SCAN.findall(plan or '')))
+
+
+def is_index_only(plan):
+    """Whether a query plan answers from an index without reading table rows."""
+    return bool(INDEX_ONLY_SCAN.search(plan or ''))
+
+
+class QueryLog:
+    """
+    ``execute_wrapper`` that records every SQL statement run while it is
+    installed, with its duration in milliseconds.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': params,
+                'many': many,
+                'ms': (time.perf_counter() - started) * 1000,
+                'using': context['connection'].alias,
+            })
+
+    @contextmanager
+    def capture(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    @property
+    def total_ms(self):
+        return sum(query['ms'] for query in self.queries)
+
+    def slowest(self, n):
+        return sorted(self.queries, key=lambda query: query['ms'], reverse=True)[:n]
+
+
+def explain(sql, params, using='default', analyze=False):
+    """
+    Query plan for a SELECT statement as text, or None where unsupported.
+
+    With ``analyze`` (PostgreSQL only) the statement is executed, inside a
+    transaction that is always rolled back.
+    """
+    connection = connections[using]
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    if connection.vendor == 'postgresql':
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS) ' if analyze else 'EXPLAIN '
+    elif connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    else:
+        return None
+
+    if analyze and connection.vendor == 'postgresql':
+        with transaction.atomic(using=using):
+            rows = _fetch_plan(connection, prefix + sql, params)
+            transaction.set_rollback(True, using=using)
+    else:
+        # A plain EXPLAIN runs nothing, and a rollback here would abort any
+        # statement still being read on this connection
+        rows = _fetch_plan(connection, prefix + sql, params)
+    # SQLite returns (id, parent, notused, detail); PostgreSQL one line per row
+    return '\n'.join(str(row[-1]) for row in rows)
+
+
+def _fetch_plan(connection, sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
@@ -0,0 +1,83 @@
+import json
+import time
+from urllib.parse import urlencode
+
+import msgpack
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from coding_task.api.renderers import CBORRenderer, MessagePackRenderer, cbor2
+
+User = get_user_model()
+
+
+def formats():
+    """(name, renderer, decode) per response format, JSON first as the baseline."""
+    available = [
+        ('json', JSONRenderer(), json.loads),
+        ('msgpack', MessagePackRenderer(), lambda body: msgpack.unpackb(body, raw=False)),
+    ]
+    if cbor2:
+        available.append(('cbor', CBORRenderer(), cbor2.loads))
+    return available
+
+
+def median_ms(function, argument, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(argument)
+        timings.append((time.perf_counter() - started) * 1000)
+    return float(np.median(timings))
+
+
+class Command(BaseCommand):
+    help = 'Compares payload size and encode/decode time of the response formats on real API responses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='User to fetch responses as (default: the one with the most contacts)')
+        parser.add_argument('--repeat', type=int, default=50, help='Encodes and decodes per measurement')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(profile__isnull=False)
+        if options['username']:
+            user = users.filter(username=options['username']).first()
+        else:
+            user = users.annotate(n=Count('contacts')).order_by('-n').first()
+        contact = user.contacts.order_by('id').first() if user else None
+        if contact is None:
+            raise CommandError('No user with contacts to fetch responses as; run populate_data first')
+
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        paths = {
+            'contacts': '/api/contacts/',
+            'changes': '/api/contacts/changes/?since=0',
+            'name search': '/api/search/?' + urlencode({'q': contact.name.split()[0], 'type': 'name'}),
+            'phone search': '/api/search/?' + urlencode({'q': contact.phone_number, 'type': 'phone'}),
+        }
+
+        self.stdout.write(f'{"response":<14} {"shape":<8} {"format":<8} {"bytes":>9} {"vs json":>8} {"encode ms":>10} {"decode ms":>10}')
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for name, path in paths.items():
+                for shape in ('rows', 'columns'):
+                    separator = '&' if '?' in path else '?'
+                    response = client.get(path + (f'{separator}shape=columns' if shape == 'columns' else ''))
+                    if response.status_code != 200:
+                        raise CommandError(f'{path} returned {response.status_code}')
+                    self.measure(name, shape, response.json(), options['repeat'])
+
+    def measure(self, name, shape, data, repeat):
+        baseline = None
+        for format_name, renderer, decode in formats():
+            body = renderer.render(data)
+            baseline = baseline or len(body)
+            self.stdout.write(
+                f'{name:<14} {shape:<8} {format_name:<8} {len(body):>9} {len(body) / baseline:>8.2f} '
+                f'{median_ms(renderer.render, data, repeat):>10.3f} {median_ms(decode, body, repeat):>10.3f}'
+            )
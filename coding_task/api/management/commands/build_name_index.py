@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from coding_task.api.suggest import get_name_index_path, write_name_index
+
+
+class Command(BaseCommand):
+    help = 'Writes the name autocomplete index loaded by API workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None, help="Output path (defaults to NAME_SUGGEST['ARTIFACT_PATH'])")
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Rewrite the index every N seconds instead of once'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path'] or get_name_index_path()
+        while True:
+            started = time.monotonic()
+            names = write_name_index(path)
+            self.stdout.write(self.style.SUCCESS(
+                f'Index of {names} names written to {path} in {time.monotonic() - started:.1f}s'
+            ))
+            if not options['interval']:
+                break
+            time.sleep(max(options['interval'] - (time.monotonic() - started), 0))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from coding_task.api.snapshot import get_snapshot_path, write_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Writes the memory-mapped spam-count snapshot read by API workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None, help='Output path (defaults to SPAM_SNAPSHOT_PATH)')
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Rewrite the snapshot every N seconds instead of once'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path'] or get_snapshot_path()
+        while True:
+            started = time.monotonic()
+            rows = write_snapshot(path)
+            self.stdout.write(self.style.SUCCESS(
+                f'Snapshot of {rows} numbers written to {path} in {time.monotonic() - started:.1f}s'
+            ))
+            if not options['interval']:
+                break
+            time.sleep(max(options['interval'] - (time.monotonic() - started), 0))
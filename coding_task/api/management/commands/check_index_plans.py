@@ -0,0 +1,114 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Count
+
+from coding_task.api.instrumentation import explain, is_index_only, seq_scanned_tables
+from coding_task.api.models import Contact, NameFrequency, SpamReport
+from coding_task.api.ranges import range_count_rows, range_keys
+
+SAMPLE_NUMBER = '+10000000000'
+
+
+def hot_queries(phone_number, owner_id):
+    """
+    (name, queryset, expectation) for the statements that dominate the API.
+
+    'index-only' plans must not read table rows; 'covering' ones need
+    INCLUDE columns and are only held to that where the database has them;
+    'index' ones just must not scan the table.
+    """
+    return [
+        (
+            'spam count by number',
+            SpamReport.objects.filter(phone_number__in=[phone_number])
+            .values('phone_number').annotate(n=Count('id')).order_by(),
+            'index-only',
+        ),
+        (
+            'reports on a number after a run',
+            SpamReport.objects.filter(phone_number__in=[phone_number], id__gt=0).values_list('phone_number', 'reporter'),
+            'covering',
+        ),
+        (
+            'contacts by number',
+            Contact.objects.filter(phone_number=phone_number).values_list('owner', 'name', 'spam_reported'),
+            'covering',
+        ),
+        (
+            'contact list',
+            Contact.objects.filter(owner_id=owner_id).order_by('id').values('id', 'name', 'phone_number', 'spam_reported')[:20],
+            'covering',
+        ),
+        (
+            'spam-flagged contact list',
+            Contact.objects.filter(owner_id=owner_id, spam_reported=True).order_by('id')
+            .values('id', 'name', 'phone_number', 'spam_reported')[:20],
+            'covering',
+        ),
+        (
+            'saved names',
+            NameFrequency.objects.filter(phone_number=phone_number).order_by('-count', 'name')
+            .values('name', 'phone_number', 'count')[:5],
+            'index-only',
+        ),
+        (
+            'number range counts',
+            range_count_rows([key for key, _ in range_keys(phone_number)]),
+            'index',
+        ),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Checks that each hot API query is planned as an index-only (or at least index) scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument(
+            '--costs', action='store_true',
+            help="PostgreSQL: keep the planner's own costs. By default sequential scans are disabled "
+                 "for the check, so a small or unanalyzed table does not hide a missing index"
+        )
+
+    def handle(self, *args, **options):
+        using = options['database']
+        connection = connections[using]
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError(f'Query plans are not supported on {connection.vendor}')
+
+        phone_number = SpamReport.objects.using(using).values_list('phone_number', flat=True).first() or SAMPLE_NUMBER
+        owner_id = Contact.objects.using(using).values_list('owner_id', flat=True).first() or 0
+
+        failures = []
+        for name, queryset, expectation in hot_queries(phone_number, owner_id):
+            plan = self.plan(queryset.using(using), using, options['costs'])
+            if expectation == 'covering' and not connection.features.supports_covering_indexes:
+                expectation = 'index'
+            scanned = seq_scanned_tables(plan)
+            if scanned:
+                problem = f"sequential scan on {', '.join(scanned)}"
+            elif expectation in ('index-only', 'covering'):
+                problem = None if is_index_only(plan) else 'reads table rows (not index-only)'
+            else:
+                problem = None
+
+            if problem:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'FAIL {name}: {problem}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'ok   {name} ({expectation})'))
+            if problem or options['verbosity'] > 1:
+                self.stdout.write('\n'.join(f'     | {line}' for line in plan.splitlines()))
+
+        if failures:
+            raise CommandError(f"{len(failures)} hot queries without the expected plan: {', '.join(failures)}")
+
+    @staticmethod
+    def plan(queryset, using, costs):
+        sql, params = queryset.query.sql_with_params()
+        if costs or connections[using].vendor != 'postgresql':
+            return explain(sql, params, using)
+        with transaction.atomic(using=using):
+            with connections[using].cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            return explain(sql, params, using)
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from coding_task.api.reports import compact_counters
+
+
+class Command(BaseCommand):
+    help = 'Folds the sharded report counters into UserProfile.spam_count and SpamRangeCount'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Compact every N seconds instead of once'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            changed = compact_counters()
+            self.stdout.write(self.style.SUCCESS(
+                f'{changed} counters compacted in {time.monotonic() - started:.2f}s'
+            ))
+            if not options['interval']:
+                break
+            time.sleep(max(options['interval'] - (time.monotonic() - started), 0))
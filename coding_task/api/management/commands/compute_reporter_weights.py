@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from coding_task.api.reputation import CHUNK_SIZE, ITERATIONS, run_batch
+
+
+class Command(BaseCommand):
+    help = 'Recomputes reporter reputation weights and the weighted spam score of every reported number'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=ITERATIONS)
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Reports per vectorized pass')
+        parser.add_argument('--tmpdir', default=None, help='Where to keep the memory-mapped report matrix')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        run = run_batch(
+            iterations=options['iterations'],
+            chunk_size=options['chunk_size'],
+            directory=options['tmpdir'],
+            log=self.stdout.write
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Run {run.id} covering reports up to id {run.max_report_id} finished in {time.monotonic() - started:.1f}s'
+        ))
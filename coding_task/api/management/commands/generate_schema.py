@@ -0,0 +1,27 @@
+import os
+
+from django.core.management.base import BaseCommand
+from drf_spectacular.settings import spectacular_settings
+
+from coding_task.api.schema import get_schema_artifact_path, render_schema
+
+
+class Command(BaseCommand):
+    help = 'Generates the OpenAPI schema artifact served at /schema/ (run at deploy time)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=None, help='Output path (defaults to SCHEMA_ARTIFACT_PATH)')
+
+    def handle(self, *args, **options):
+        path = options['file'] or get_schema_artifact_path()
+
+        generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+        content = render_schema(generator.get_schema(request=None, public=True))
+
+        # Write next to the target and rename so running workers never read a partial file
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+        self.stdout.write(self.style.SUCCESS(f'Schema written to {path} ({len(content)} bytes)'))
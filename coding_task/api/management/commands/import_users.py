@@ -0,0 +1,173 @@
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from coding_task.api.models import UserProfile
+from coding_task.api.serializers import UserImportSerializer
+
+User = get_user_model()
+
+
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            # Empty cells are missing values, not empty strings
+            yield {key: value for key, value in row.items() if value not in ('', None)}
+        return
+    for line in stream:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield {'_error': 'Invalid JSON'}
+
+
+class Command(BaseCommand):
+    help = 'Imports users with profiles from a CSV or NDJSON file, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or NDJSON file ('-' for stdin)")
+        parser.add_argument('--format', choices=['csv', 'ndjson'], default=None,
+                            help='Input format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Password hashing processes (0 hashes in this process)')
+        parser.add_argument('--checkpoint', default=None,
+                            help='Progress file (default: <path>.progress)')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip the rows recorded in the checkpoint')
+        parser.add_argument('--rejects', default=None,
+                            help='Write rejected rows and their errors as NDJSON to this path')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+        checkpoint = options['checkpoint'] or (None if path == '-' else f'{path}.progress')
+        if options['resume'] and not checkpoint:
+            raise CommandError('--resume needs --checkpoint when reading from stdin')
+
+        done = self.load_checkpoint(checkpoint) if options['resume'] else 0
+        self.stats = {'imported': 0, 'rejected': 0}
+        self.rejects = open(options['rejects'], 'a') if options['rejects'] else None
+        self.started = time.monotonic()
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        executor = ProcessPoolExecutor(options['workers'], initializer=django.setup) if options['workers'] else None
+        try:
+            rows = islice(read_rows(stream, fmt), done, None)
+            while batch := list(islice(rows, options['batch_size'])):
+                self.import_batch(batch, done, executor)
+                done += len(batch)
+                self.save_checkpoint(checkpoint, done)
+                self.report(done)
+        except IntegrityError as e:
+            raise CommandError(
+                f'Batch starting at row {done + 1} conflicts with rows written concurrently ({e}); '
+                'rerun with --resume to continue from it'
+            )
+        finally:
+            if executor:
+                executor.shutdown()
+            if stream is not sys.stdin:
+                stream.close()
+            if self.rejects:
+                self.rejects.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.stats['imported']} users, rejected {self.stats['rejected']}"
+        ))
+
+    def import_batch(self, batch, offset, executor):
+        valid = []
+        for line, row in enumerate(batch, offset + 1):
+            if '_error' in row:
+                self.reject(line, row, row['_error'])
+                continue
+            serializer = UserImportSerializer(data=row)
+            if serializer.is_valid():
+                valid.append((line, row, serializer.validated_data))
+            else:
+                self.reject(line, row, serializer.errors)
+
+        # One query per batch for each unique column, instead of two per user
+        taken_usernames = set(User.objects.filter(
+            username__in=[data['username'] for _, _, data in valid]
+        ).values_list('username', flat=True))
+        taken_numbers = set(UserProfile.objects.filter(
+            phone_number__in=[data['phone_number'] for _, _, data in valid]
+        ).values_list('phone_number', flat=True))
+
+        accepted = []
+        for line, row, data in valid:
+            if data['username'] in taken_usernames:
+                self.reject(line, row, {'username': ['This username is already taken']})
+            elif data['phone_number'] in taken_numbers:
+                self.reject(line, row, {'phone_number': ['This phone number is already registered']})
+            else:
+                taken_usernames.add(data['username'])
+                taken_numbers.add(data['phone_number'])
+                accepted.append(data)
+        if not accepted:
+            return
+
+        passwords = [data['password'] for data in accepted]
+        if executor:
+            hashes = list(executor.map(make_password, passwords, chunksize=max(len(passwords) // 64, 1)))
+        else:
+            hashes = [make_password(password) for password in passwords]
+
+        users = []
+        for data, password_hash in zip(accepted, hashes):
+            user = User(username=data['username'], name=data['name'], password=password_hash)
+            # bulk_create() does not call save()
+            user.refresh_search_keys()
+            users.append(user)
+
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            profiles = []
+            for user, data in zip(users, accepted):
+                profile = UserProfile(user=user, phone_number=data['phone_number'], email=data.get('email'))
+                profile.refresh_search_keys()
+                profiles.append(profile)
+            UserProfile.objects.bulk_create(profiles)
+        self.stats['imported'] += len(users)
+
+    def reject(self, line, row, errors):
+        self.stats['rejected'] += 1
+        if self.rejects:
+            row = {key: value for key, value in row.items() if key not in ('password', '_error')}
+            self.rejects.write(json.dumps({'line': line, 'row': row, 'errors': errors}) + '\n')
+
+    def report(self, done):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f"{done} rows read, {self.stats['imported']} imported, {self.stats['rejected']} rejected "
+            f"({self.stats['imported'] / elapsed if elapsed else 0:.0f} users/s)"
+        )
+
+    def load_checkpoint(self, checkpoint):
+        try:
+            with open(checkpoint) as f:
+                return json.load(f)['rows']
+        except FileNotFoundError:
+            return 0
+
+    def save_checkpoint(self, checkpoint, rows):
+        if not checkpoint:
+            return
+        tmp_path = f'{checkpoint}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'rows': rows}, f)
+        os.replace(tmp_path, checkpoint)
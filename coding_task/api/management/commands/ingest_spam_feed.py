@@ -0,0 +1,158 @@
+import csv
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from coding_task.api.models import SpamReport
+from coding_task.api.normalization import digits_only, reverse_digits
+from coding_task.api.reports import count_bulk_reports
+
+User = get_user_model()
+
+STAGING_TABLE = 'spam_feed_staging'
+
+
+def normalize_number(value):
+    """
+    A feed number as '+<digits>' (or bare digits when it had no
+    international prefix), or None if it is not a phone number.
+    """
+    value = (value or '').strip()
+    digits = digits_only(value)
+    if value.startswith('+'):
+        number = f'+{digits}'
+    elif digits.startswith('00'):
+        number = f'+{digits[2:]}'
+    else:
+        number = digits
+    return number if 9 <= len(digits_only(number)) <= 15 else None
+
+
+def read_numbers(stream, column):
+    """The cell in ``column`` (index or header name) of each CSV row; '' for short rows."""
+    rows = csv.reader(stream)
+    if not column.isdigit():
+        header = next(rows, [])
+        if column not in header:
+            raise CommandError(f"No column '{column}' in the header: {', '.join(header)}")
+        index = header.index(column)
+    else:
+        index = int(column)
+    for row in rows:
+        yield row[index] if len(row) > index else ''
+
+
+class Command(BaseCommand):
+    help = 'Loads a carrier CSV feed of known spam numbers as reports by a system reporter, in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file')
+        parser.add_argument('--column', default='0', help='Column holding the number: index or header name (default: 0)')
+        parser.add_argument('--reporter', default='carrier-feed',
+                            help='Username of the system reporter the reports are attributed to (created if missing)')
+        parser.add_argument('--chunk-size', type=int, default=10000)
+        parser.add_argument('--checkpoint', default=None, help='Progress file (default: <path>.progress)')
+        parser.add_argument('--resume', action='store_true', help='Skip the rows recorded in the checkpoint')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        checkpoint = options['checkpoint'] or f'{path}.progress'
+        done = self.load_checkpoint(checkpoint) if options['resume'] else 0
+        reporter = self.system_reporter(options['reporter'])
+        merge = self.merge_copy if connection.vendor == 'postgresql' else self.merge_bulk_create
+        self.stats = {'new': 0, 'known': 0, 'invalid': 0}
+        self.started = time.monotonic()
+
+        with open(path, newline='', encoding='utf-8') as stream:
+            # Rows, not lines, are counted, so a resumed run skips the same rows
+            numbers = islice(read_numbers(stream, options['column']), done, None)
+            while chunk := list(islice(numbers, options['chunk_size'])):
+                normalized = [number for number in map(normalize_number, chunk) if number]
+                valid = set(normalized)
+                with transaction.atomic():
+                    new = merge(reporter, sorted(valid))
+                    if new:
+                        count_bulk_reports(reporter, new)
+                self.stats['new'] += len(new)
+                # Repeats within the chunk count as known too
+                self.stats['known'] += len(normalized) - len(new)
+                self.stats['invalid'] += len(chunk) - len(normalized)
+                done += len(chunk)
+                # Written after the commit; a chunk redone after a crash
+                # in between adds nothing, as its reports already exist
+                self.save_checkpoint(checkpoint, done)
+                self.report(done)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Ingested {self.stats['new']} new reports; {self.stats['known']} already reported, "
+            f"{self.stats['invalid']} invalid"
+        ))
+
+    @staticmethod
+    def system_reporter(username):
+        reporter, created = User.objects.get_or_create(username=username, defaults={'is_active': False})
+        if created:
+            reporter.set_unusable_password()
+            reporter.save(update_fields=['password'])
+        return reporter
+
+    @staticmethod
+    def merge_copy(reporter, numbers):
+        """PostgreSQL: COPY the chunk into a staging table and insert the new reports in one statement."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} '
+                '(phone_number varchar(17), phone_reversed varchar(17)) ON COMMIT DELETE ROWS'
+            )
+            buffer = io.StringIO(''.join(f'{number}\t{reverse_digits(number)}\n' for number in numbers))
+            cursor.copy_expert(f'COPY {STAGING_TABLE} (phone_number, phone_reversed) FROM STDIN', buffer)
+            cursor.execute(
+                f'INSERT INTO {SpamReport._meta.db_table} (reporter_id, phone_number, phone_reversed, timestamp) '
+                f'SELECT %s, phone_number, phone_reversed, %s FROM {STAGING_TABLE} '
+                'ON CONFLICT (reporter_id, phone_number) DO NOTHING RETURNING phone_number',
+                [reporter.id, timezone.now()]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    @staticmethod
+    def merge_bulk_create(reporter, numbers):
+        """Other databases: skip the numbers already reported and bulk_create the rest."""
+        known = set(
+            SpamReport.objects.filter(reporter=reporter, phone_number__in=numbers).values_list('phone_number', flat=True)
+        )
+        new = [number for number in numbers if number not in known]
+        reports = []
+        for number in new:
+            report = SpamReport(reporter=reporter, phone_number=number)
+            # bulk_create() does not call save()
+            report.refresh_search_keys()
+            reports.append(report)
+        SpamReport.objects.bulk_create(reports, batch_size=1000)
+        return new
+
+    def report(self, done):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f"{done} rows read, {self.stats['new']} new, {self.stats['known']} known, {self.stats['invalid']} invalid "
+            f"({done / elapsed if elapsed else 0:.0f} rows/s)"
+        )
+
+    def load_checkpoint(self, checkpoint):
+        try:
+            with open(checkpoint) as f:
+                return json.load(f)['rows']
+        except FileNotFoundError:
+            return 0
+
+    def save_checkpoint(self, checkpoint, rows):
+        tmp_path = f'{checkpoint}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'rows': rows}, f)
+        os.replace(tmp_path, checkpoint)
@@ -0,0 +1,292 @@
+import http.client
+import itertools
+import json
+import random
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from coding_task.api.models import Contact, SpamReport
+
+User = get_user_model()
+
+DEFAULT_MIX = 'phone=70,name=15,contacts=10,report=5'
+KEY_SAMPLE = 10000
+
+
+class ZipfSampler:
+    """Draws items with probability proportional to 1 / rank ** exponent."""
+
+    def __init__(self, items, exponent):
+        self.items = items
+        weights = 1.0 / np.arange(1, len(items) + 1) ** exponent
+        self.cumulative = np.cumsum(weights / weights.sum())
+
+    def sample(self, rng):
+        index = int(np.searchsorted(self.cumulative, rng.random()))
+        return self.items[min(index, len(self.items) - 1)]
+
+
+class InProcessTransport:
+    """Calls the WSGI app directly through Django's test client."""
+
+    def __init__(self):
+        self.client = Client()
+
+    def request(self, method, path, data, token):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+        if method == 'POST':
+            response = self.client.post(path, data, content_type='application/json', **headers)
+        else:
+            response = self.client.get(path, **headers)
+        return response.status_code
+
+    def close(self):
+        connections.close_all()
+
+
+class HttpTransport:
+    """Keep-alive HTTP connection to a running server."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.netloc, timeout=30)
+        self.prefix = parts.path.rstrip('/')
+
+    def request(self, method, path, data, token):
+        headers = {'Authorization': f'Bearer {token}'}
+        body = None
+        if method == 'POST':
+            body = json.dumps(data)
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.connection.request(method, self.prefix + path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            self.connection.close()
+            raise
+        return response.status
+
+    def close(self):
+        self.connection.close()
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = []  # (seconds since start, operation, latency ms, status or None)
+        self.started = time.monotonic()
+
+    def record(self, operation, latency_ms, status):
+        with self.lock:
+            self.samples.append((time.monotonic() - self.started, operation, latency_ms, status))
+
+    def since(self, position):
+        with self.lock:
+            return self.samples[position:], len(self.samples)
+
+
+def summarize(samples, seconds):
+    latencies = np.array([s[2] for s in samples]) if samples else np.zeros(0)
+    errors = sum(1 for s in samples if s[3] is None or s[3] >= 500)
+    rejected = sum(1 for s in samples if s[3] is not None and 400 <= s[3] < 500)
+    summary = {
+        'requests': len(samples),
+        'throughput': round(len(samples) / seconds, 1) if seconds else 0,
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else 0,
+        'rejected': rejected,
+    }
+    for name, q in (('p50', 50), ('p95', 95), ('p99', 99)):
+        summary[name] = round(float(np.percentile(latencies, q)), 2) if samples else None
+    return summary
+
+
+class Command(BaseCommand):
+    help = 'Drives a weighted mix of API requests from concurrent threads and reports latency percentiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default=None, help='Base URL of a running server (default: call the app in-process)')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Operation weights (default: {DEFAULT_MIX})')
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--duration', type=int, default=30, help='Seconds to run')
+        parser.add_argument('--interval', type=int, default=5, help='Seconds between progress reports')
+        parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent for key popularity')
+        parser.add_argument('--users', type=int, default=50, help='Distinct users to authenticate as')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--output', default=None, help='Write results as JSON to this path')
+        parser.add_argument('--compare', default=None, help='Earlier results file to compare against')
+
+    def handle(self, *args, **options):
+        self.mix = self.parse_mix(options['mix'])
+        self.load_keys(options['zipf'])
+        self.hot_number = f'+1999{random.randrange(10 ** 8):08}'
+        self.hot_reporters = itertools.count()
+        self.tokens = [
+            str(RefreshToken.for_user(user).access_token)
+            for user in User.objects.filter(is_active=True, profile__isnull=False)[:options['users']]
+        ]
+        if not self.tokens:
+            raise CommandError('No users with profiles to authenticate as; run populate_data first')
+
+        if options['url']:
+            results = self.run(options)
+        else:
+            # The test client sends Host: testserver
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                results = self.run(options)
+        self.print_summary(results)
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                self.print_comparison(json.load(f), results)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def run(self, options):
+        recorder = Recorder()
+        deadline = time.monotonic() + options['duration']
+        seed = options['seed'] if options['seed'] is not None else random.randrange(2 ** 32)
+        workers = [
+            threading.Thread(target=self.worker, args=(options['url'], recorder, deadline, seed + i))
+            for i in range(options['threads'])
+        ]
+        for worker in workers:
+            worker.start()
+
+        intervals = []
+        position = 0
+        last_mark = recorder.started
+        while any(worker.is_alive() for worker in workers):
+            time.sleep(min(options['interval'], max(deadline - time.monotonic(), 0.1)))
+            samples, position = recorder.since(position)
+            now = time.monotonic()
+            interval = {'t': round(now - recorder.started, 1), **summarize(samples, now - last_mark)}
+            last_mark = now
+            intervals.append(interval)
+            self.stdout.write(
+                f"t={interval['t']:>6}s  {interval['throughput']:>8} req/s  p50={interval['p50']}ms  "
+                f"p95={interval['p95']}ms  p99={interval['p99']}ms  errors={interval['errors']}"
+            )
+        for worker in workers:
+            worker.join()
+
+        return {
+            'config': {key: options[key] for key in ('url', 'mix', 'threads', 'duration', 'zipf', 'users')},
+            'summary': {
+                operation: summarize([s for s in recorder.samples if s[1] == operation], options['duration'])
+                for operation in self.mix
+            },
+            'overall': summarize(recorder.samples, options['duration']),
+            'intervals': intervals,
+        }
+
+    def parse_mix(self, mix):
+        weights = {}
+        for part in mix.split(','):
+            name, _, weight = part.partition('=')
+            if name not in self.operations():
+                raise CommandError(f"Unknown operation '{name}'; choose from {', '.join(self.operations())}")
+            try:
+                weights[name] = float(weight)
+            except ValueError:
+                raise CommandError(f"Weight of '{name}' must be a number, not '{weight}'")
+        return weights
+
+    def operations(self):
+        return {
+            'phone': self.phone_lookup,
+            'name': self.name_search,
+            'contacts': self.contact_list,
+            'report': self.spam_report,
+            'hotreport': self.hot_report,
+        }
+
+    def load_keys(self, exponent):
+        numbers = list(
+            Contact.objects.values_list('phone_number', flat=True).distinct()[:KEY_SAMPLE]
+        ) + list(SpamReport.objects.values_list('phone_number', flat=True).distinct()[:KEY_SAMPLE])
+        names = list(Contact.objects.values_list('name', flat=True).distinct()[:KEY_SAMPLE])
+        if not numbers or not names:
+            raise CommandError('No contacts to draw keys from; run populate_data first')
+
+        random.shuffle(numbers)
+        random.shuffle(names)
+        self.numbers = ZipfSampler(list(dict.fromkeys(numbers)), exponent)
+        self.names = ZipfSampler([name.split()[0] for name in names], exponent)
+
+    def phone_lookup(self, rng):
+        return 'GET', '/api/search/?' + urlencode({'q': self.numbers.sample(rng), 'type': 'phone'}), None
+
+    def name_search(self, rng):
+        return 'GET', '/api/search/?' + urlencode({'q': self.names.sample(rng), 'type': 'name'}), None
+
+    def contact_list(self, rng):
+        return 'GET', '/api/contacts/', None
+
+    def spam_report(self, rng):
+        return 'POST', '/api/spam-reports/', {'phone_number': self.numbers.sample(rng)}
+
+    def hot_report(self, rng):
+        # Everyone reporting one number at once, as when a spam number goes viral
+        return 'POST', '/api/spam-reports/', {'phone_number': self.hot_number}
+
+    def next_token(self, operation, rng):
+        if operation == 'hotreport':
+            # Each user can report the hot number once, so take users in turn
+            return self.tokens[next(self.hot_reporters) % len(self.tokens)]
+        return self.tokens[rng.integers(len(self.tokens))]
+
+    def worker(self, url, recorder, deadline, seed):
+        rng = np.random.default_rng(seed)
+        operations = self.operations()
+        names = list(self.mix)
+        weights = np.array([self.mix[name] for name in names])
+        weights = weights / weights.sum()
+        transport = HttpTransport(url) if url else InProcessTransport()
+        try:
+            while time.monotonic() < deadline:
+                operation = names[rng.choice(len(names), p=weights)]
+                method, path, data = operations[operation](rng)
+                token = self.next_token(operation, rng)
+                started = time.perf_counter()
+                try:
+                    status = transport.request(method, path, data, token)
+                except Exception:
+                    status = None
+                recorder.record(operation, (time.perf_counter() - started) * 1000, status)
+        finally:
+            transport.close()
+
+    def print_summary(self, results):
+        self.stdout.write('\noperation   requests   req/s     p50      p95      p99   errors  rejected')
+        for operation, summary in list(results['summary'].items()) + [('overall', results['overall'])]:
+            self.stdout.write(
+                f"{operation:<10} {summary['requests']:>9} {summary['throughput']:>7} "
+                f"{summary['p50'] or 0:>8} {summary['p95'] or 0:>8} {summary['p99'] or 0:>8} "
+                f"{summary['errors']:>8} {summary['rejected']:>9}"
+            )
+
+    def print_comparison(self, previous, current):
+        self.stdout.write('\nagainst previous run (p99 ms, req/s):')
+        for operation, summary in list(current['summary'].items()) + [('overall', current['overall'])]:
+            before = previous['overall'] if operation == 'overall' else previous['summary'].get(operation)
+            if not before or not before['p99'] or not summary['p99']:
+                continue
+            change = (summary['p99'] - before['p99']) / before['p99'] * 100
+            self.stdout.write(
+                f"{operation:<10} p99 {before['p99']} -> {summary['p99']} ({change:+.1f}%)  "
+                f"req/s {before['throughput']} -> {summary['throughput']}"
+            )
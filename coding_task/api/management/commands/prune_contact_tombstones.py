@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from coding_task.api.sync import get_sync_setting, prune_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Deletes old contact tombstones; clients synced before them must resync in full'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help=f"Keep tombstones this many days (default: {get_sync_setting('TOMBSTONE_DAYS')})"
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} tombstones'))
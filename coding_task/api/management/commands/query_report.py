@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from coding_task.api.instrumentation import seq_scanned_tables
+from coding_task.api.models import QueryFingerprint
+from coding_task.api.slowlog import recorder
+
+# Large tables where a sequential scan is always worth a look
+WATCHED_TABLES = ('api_contact', 'api_spamreport', 'api_userprofile')
+
+ORDERINGS = {
+    'total': '-total_ms',
+    'calls': '-calls',
+    'mean': '-mean_ms',
+    'max': '-max_ms',
+    'slow': '-slow_calls',
+}
+
+
+class Command(BaseCommand):
+    help = 'Ranks SQL fingerprints recorded by the slow-query log and flags sequential scans on large tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--order', choices=ORDERINGS, default='total')
+        parser.add_argument('--plans', action='store_true', help='Print the captured plan of each fingerprint')
+        parser.add_argument('--reset', action='store_true', help='Delete all recorded fingerprints afterwards')
+
+    def handle(self, *args, **options):
+        # Include this process's unflushed totals
+        recorder.flush()
+        fingerprints = (
+            QueryFingerprint.objects.annotate(mean_ms=F('total_ms') / F('calls'))
+            .order_by(ORDERINGS[options['order']])[:options['limit']]
+        )
+
+        self.stdout.write(f"{'rank':>4} {'calls':>9} {'slow':>7} {'total ms':>11} {'mean ms':>9} {'max ms':>9}  sql")
+        for rank, entry in enumerate(fingerprints, 1):
+            self.stdout.write(
+                f"{rank:>4} {entry.calls:>9} {entry.slow_calls:>7} {entry.total_ms:>11.1f} "
+                f"{entry.mean_ms:>9.2f} {entry.max_ms:>9.1f}  {entry.sql[:160]}"
+            )
+            scanned = [table for table in seq_scanned_tables(entry.plan) if table in WATCHED_TABLES]
+            if scanned:
+                self.stdout.write(self.style.WARNING(
+                    f"     sequential scan on {', '.join(scanned)}: add an index for this access path"
+                ))
+            if options['plans'] and entry.plan:
+                self.stdout.write('\n'.join(f'     | {line}' for line in entry.plan.splitlines()))
+
+        if options['reset']:
+            QueryFingerprint.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS('Recorded fingerprints deleted'))
@@ -0,0 +1,33 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from coding_task.api.summary import rebuild_summaries
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Recomputes every AddressBookSummary (contacts, spam contacts, reports filed) from the tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users per transaction')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        last_id, rebuilt = 0, 0
+        while True:
+            owner_ids = list(
+                User.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not owner_ids:
+                break
+            rebuild_summaries(owner_ids)
+            last_id = owner_ids[-1]
+            rebuilt += len(owner_ids)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{rebuilt} users rebuilt')
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {rebuilt} address-book summaries in {time.monotonic() - started:.2f}s'
+        ))
@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Count, Exists, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Concat
+
+from coding_task.api.models import Contact, CounterShard, SpamReport, UserProfile
+from coding_task.api.reports import SPAM_COUNTS
+from coding_task.api.sync import set_spam_flag
+
+TABLES = ('profiles', 'contacts')
+
+
+class Progress:
+    """
+    Completed chunks per table and the resumable high-water mark.
+
+    Chunks finish out of order on the pool, so the mark only advances over
+    a contiguous run of finished chunks.
+    """
+
+    def __init__(self, path, resume):
+        self.path = path
+        self.lock = threading.Lock()
+        self.marks = {table: 0 for table in TABLES}
+        if resume and path and os.path.exists(path):
+            with open(path) as f:
+                self.marks.update(json.load(f))
+        self.finished = {table: set() for table in TABLES}
+        self.stats = {table: {'scanned': 0, 'changed': 0} for table in TABLES}
+
+    def done(self, table, start, end, scanned, changed):
+        with self.lock:
+            self.finished[table].add((start, end))
+            ends = dict(self.finished[table])
+            while self.marks[table] in ends:
+                self.marks[table] = ends.pop(self.marks[table])
+            self.finished[table] = set(ends.items())
+            self.stats[table]['scanned'] += scanned
+            self.stats[table]['changed'] += changed
+            self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.marks, f)
+        os.replace(tmp_path, self.path)
+
+
+class Command(BaseCommand):
+    help = 'Recomputes UserProfile.spam_count and Contact.spam_reported from SpamReport'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--table', choices=TABLES, action='append', help='Only reconcile this table (repeatable)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Primary-key range per chunk')
+        parser.add_argument('--workers', type=int, default=4, help='Chunks processed concurrently')
+        parser.add_argument(
+            '--pause', type=float, default=0.5,
+            help='After each chunk a worker sleeps this multiple of the time the chunk took, '
+                 'capping its share of database time'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Count differences without writing them')
+        parser.add_argument('--checkpoint', default='reconcile_spam.progress',
+                            help="Progress file ('' to disable)")
+        parser.add_argument('--resume', action='store_true', help='Start after the ranges in the checkpoint')
+
+    def handle(self, *args, **options):
+        self.options = options
+        # A dry run changes nothing, so it must not mark ranges as done
+        checkpoint = None if options['dry_run'] else options['checkpoint'] or None
+        progress = Progress(checkpoint, options['resume'])
+        for table in options['table'] or TABLES:
+            model = UserProfile if table == 'profiles' else Contact
+            max_id = model.objects.aggregate(m=Max('id'))['m'] or 0
+            self.stdout.write(f'{table}: ids {progress.marks[table] + 1}..{max_id}')
+            self.run_table(table, progress, max_id)
+            stats = progress.stats[table]
+            verb = 'would change' if options['dry_run'] else 'changed'
+            self.stdout.write(self.style.SUCCESS(f"{table}: {stats['scanned']} scanned, {verb} {stats['changed']}"))
+
+    def run_table(self, table, progress, max_id):
+        chunk_size = self.options['chunk_size']
+        reconcile = self.reconcile_profiles if table == 'profiles' else self.reconcile_contacts
+        chunks = iter(range(progress.marks[table], max_id, chunk_size))
+        report_every = max(self.options['workers'] * 20, 1)
+
+        with ThreadPoolExecutor(self.options['workers']) as pool:
+            running = set()
+            submitted = 0
+            for start in chunks:
+                # Bounded in-flight work, so 100M rows do not queue 20k futures
+                if len(running) >= self.options['workers'] * 2:
+                    finished, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        future.result()
+                end = min(start + chunk_size, max_id)
+                running.add(pool.submit(self.run_chunk, reconcile, table, progress, start, end))
+                submitted += 1
+                if submitted % report_every == 0:
+                    stats = progress.stats[table]
+                    self.stdout.write(f"{table}: up to id {progress.marks[table]}, {stats['changed']} changed")
+            for future in running:
+                future.result()
+
+    def run_chunk(self, reconcile, table, progress, start, end):
+        try:
+            started = time.monotonic()
+            scanned, changed = reconcile(start, end)
+            progress.done(table, start, end, scanned, changed)
+            time.sleep((time.monotonic() - started) * self.options['pause'])
+        finally:
+            connections.close_all()
+
+    def reconcile_profiles(self, start, end):
+        """
+        Profiles with ids in (start, end]: spam_count plus the number's
+        uncompacted counter shards is the number of reports for the number.
+        """
+        # One statement, so the counts and shards are read at the same instant
+        rows = list(
+            UserProfile.objects.filter(id__gt=start, id__lte=end)
+            .annotate(
+                reports=Coalesce(Subquery(
+                    SpamReport.objects.filter(phone_number=OuterRef('phone_number'))
+                    .values('phone_number').annotate(n=Count('id')).values('n')
+                ), 0),
+                pending=Coalesce(Subquery(
+                    CounterShard.objects.filter(key=Concat(Value(f'{SPAM_COUNTS}:'), OuterRef('phone_number')))
+                    .values('key').annotate(total=Sum('value')).values('total')
+                ), 0),
+            )
+            .values_list('id', 'spam_count', 'reports', 'pending')
+        )
+        stale = [
+            (pk, spam_count, reports - pending)
+            for pk, spam_count, reports, pending in rows if spam_count != reports - pending
+        ]
+        if stale and not self.options['dry_run']:
+            with transaction.atomic():
+                for pk, old, new in stale:
+                    # Skip the row if a compaction changed it since it was read
+                    UserProfile.objects.filter(id=pk, spam_count=old).update(spam_count=new)
+        return len(rows), len(stale)
+
+    def reconcile_contacts(self, start, end):
+        """Contacts with ids in (start, end]: spam_reported is whether the number has any report."""
+        rows = list(Contact.objects.filter(id__gt=start, id__lte=end).values_list('id', 'phone_number', 'spam_reported'))
+        reported = set(self.report_counts({number for _, number, _ in rows}))
+        stale = {True: [], False: []}
+        for pk, number, spam_reported in rows:
+            if spam_reported != (number in reported):
+                stale[number in reported].append(pk)
+        if not self.options['dry_run']:
+            if stale[True]:
+                # Through sync, so clients see the flag change in their next delta
+                set_spam_flag(Contact.objects.filter(id__in=stale[True]), True)
+            if stale[False]:
+                set_spam_flag(
+                    Contact.objects.filter(id__in=stale[False]).exclude(
+                        Exists(SpamReport.objects.filter(phone_number=OuterRef('phone_number')))
+                    ),
+                    False
+                )
+        return len(rows), len(stale[True]) + len(stale[False])
+
+    @staticmethod
+    def report_counts(numbers):
+        if not numbers:
+            return {}
+        return dict(
+            SpamReport.objects.filter(phone_number__in=numbers)
+            .values('phone_number')
+            .annotate(n=Count('id'))
+            .order_by()
+            .values_list('phone_number', 'n')
+        )
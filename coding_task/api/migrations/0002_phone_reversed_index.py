@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:56
+
+import re
+
+from django.db import migrations, models
+
+
+def backfill_phone_reversed(apps, schema_editor):
+    for model_name in ('Contact', 'SpamReport', 'UserProfile'):
+        model = apps.get_model('api', model_name)
+        batch = []
+        for obj in model.objects.only('id', 'phone_number').iterator(chunk_size=2000):
+            obj.phone_reversed = re.sub(r'\D', '', obj.phone_number)[::-1]
+            batch.append(obj)
+            if len(batch) >= 2000:
+                model.objects.bulk_update(batch, ['phone_reversed'])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ['phone_reversed'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contact',
+            name='phone_reversed',
+            field=models.CharField(blank=True, editable=False, max_length=17),
+        ),
+        migrations.AddField(
+            model_name='spamreport',
+            name='phone_reversed',
+            field=models.CharField(blank=True, editable=False, max_length=17),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='phone_reversed',
+            field=models.CharField(blank=True, editable=False, max_length=17),
+        ),
+        migrations.RunPython(backfill_phone_reversed, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['phone_reversed'], name='api_contact_phone_rev_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='spamreport',
+            index=models.Index(fields=['phone_reversed'], name='api_spamrep_phone_rev_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['phone_reversed'], name='api_userpro_phone_rev_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
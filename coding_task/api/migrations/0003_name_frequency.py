@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:59
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_name_frequency(apps, schema_editor):
+    Contact = apps.get_model('api', 'Contact')
+    NameFrequency = apps.get_model('api', 'NameFrequency')
+    rows = (
+        Contact.objects.values('phone_number', 'name')
+        .annotate(count=Count('id'))
+        .order_by()
+        .iterator(chunk_size=5000)
+    )
+    batch = []
+    for row in rows:
+        batch.append(NameFrequency(**row))
+        if len(batch) >= 5000:
+            NameFrequency.objects.bulk_create(batch)
+            batch = []
+    NameFrequency.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_phone_reversed_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NameFrequency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_number', models.CharField(max_length=17)),
+                ('name', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['phone_number', '-count'], name='api_namefreq_top_idx')],
+                'unique_together': {('phone_number', 'name')},
+            },
+        ),
+        migrations.RunPython(backfill_name_frequency, migrations.RunPython.noop),
+    ]
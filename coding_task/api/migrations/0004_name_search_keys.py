@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:01
+
+from django.db import migrations, models
+
+from coding_task.api.normalization import normalize_name, phonetic_key
+
+
+def backfill_name_keys(apps, schema_editor):
+    for model_name in ('Contact', 'User'):
+        model = apps.get_model('api', model_name)
+        batch = []
+        for obj in model.objects.only('id', 'name').iterator(chunk_size=2000):
+            obj.name_normalized = normalize_name(obj.name)[:100]
+            obj.name_phonetic = phonetic_key(obj.name)[:100]
+            batch.append(obj)
+            if len(batch) >= 2000:
+                model.objects.bulk_update(batch, ['name_normalized', 'name_phonetic'])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ['name_normalized', 'name_phonetic'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_name_frequency'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contact',
+            name='name_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='name_phonetic',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='name_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='name_phonetic',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.RunPython(backfill_name_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['name_phonetic'], name='api_contact_name_phon_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['name_normalized'], name='api_contact_name_norm_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['name_phonetic'], name='api_user_name_phon_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['name_normalized'], name='api_user_name_norm_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
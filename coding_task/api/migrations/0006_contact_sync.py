@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_versions(apps, schema_editor):
+    # Existing contacts start at version 1, so a sync from 0 returns them
+    Contact = apps.get_model('api', 'Contact')
+    ContactSyncState = apps.get_model('api', 'ContactSyncState')
+    Contact.objects.update(version=1)
+    owner_ids = Contact.objects.values_list('owner_id', flat=True).distinct().order_by().iterator(chunk_size=5000)
+    batch = []
+    for owner_id in owner_ids:
+        batch.append(ContactSyncState(owner_id=owner_id, version=1))
+        if len(batch) >= 5000:
+            ContactSyncState.objects.bulk_create(batch)
+            batch = []
+    ContactSyncState.objects.bulk_create(batch)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_contact_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContactSyncState',
+            fields=[
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='contact_sync', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('version', models.BigIntegerField(default=0)),
+                ('pruned_version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ContactTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contact_id', models.BigIntegerField()),
+                ('version', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['owner', 'version'], name='api_contact_owner_ver_idx'),
+        ),
+        migrations.AddField(
+            model_name='contacttombstone',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contact_tombstones', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='contacttombstone',
+            index=models.Index(fields=['owner', 'version'], name='api_tombstone_owner_ver_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contacttombstone',
+            index=models.Index(fields=['deleted_at'], name='api_contact_deleted_2447a4_idx'),
+        ),
+        migrations.RunPython(backfill_versions, migrations.RunPython.noop),
+    ]
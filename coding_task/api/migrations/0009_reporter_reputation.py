@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_query_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReporterWeight',
+            fields=[
+                ('reporter', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reporter_weight', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('weight', models.FloatField()),
+                ('reports', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SpamScoreRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('max_report_id', models.BigIntegerField()),
+                ('started', models.DateTimeField(auto_now_add=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WeightedSpamScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_number', models.CharField(max_length=17, unique=True)),
+                ('score', models.FloatField()),
+                ('reports', models.PositiveIntegerField()),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.spamscorerun')),
+            ],
+        ),
+    ]
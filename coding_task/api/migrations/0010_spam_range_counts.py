@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:30
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+
+from coding_task.api.ranges import range_keys
+
+
+def backfill_range_counts(apps, schema_editor):
+    SpamReport = apps.get_model('api', 'SpamReport')
+    SpamRangeCount = apps.get_model('api', 'SpamRangeCount')
+    counts = Counter()
+    rows = (
+        SpamReport.objects.values_list('phone_number')
+        .annotate(n=Count('id'))
+        .order_by()
+        .iterator(chunk_size=5000)
+    )
+    for phone_number, n in rows:
+        for key, _ in range_keys(phone_number):
+            counts[key] += n
+    SpamRangeCount.objects.bulk_create(
+        (SpamRangeCount(prefix=key, reports=n) for key, n in counts.items()), batch_size=5000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_reporter_reputation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpamRangeCount',
+            fields=[
+                ('prefix', models.CharField(max_length=17, primary_key=True, serialize=False)),
+                ('reports', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_range_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_spam_range_counts'),
+    ]
+
+    # New indexes first, so no query is left without one in between
+    operations = [
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['phone_number'], include=('owner', 'name', 'spam_reported'), name='api_contact_phone_cov_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['owner', 'id'], include=('name', 'phone_number', 'spam_reported'), name='api_contact_owner_cov_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(condition=models.Q(('spam_reported', True)), fields=['owner', 'id'], include=('name', 'phone_number'), name='api_contact_spam_cov_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='namefrequency',
+            index=models.Index(fields=['phone_number', '-count', 'name'], name='api_namefreq_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='spamreport',
+            index=models.Index(fields=['phone_number', 'id'], include=('reporter',), name='api_spamrep_phone_id_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='contact',
+            name='api_contact_name_397b16_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='contact',
+            name='api_contact_phone_n_20dc54_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='contact',
+            name='api_contact_owner_i_eb51d6_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='contact',
+            name='api_contact_owner_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='contact',
+            name='api_contact_owner_spam_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='namefrequency',
+            name='api_namefreq_top_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='spamreport',
+            name='api_spamrep_phone_n_054e20_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='spamreport',
+            name='api_spamrep_reporte_42ee51_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='userprofile',
+            name='api_userpro_phone_n_7fc051_idx',
+        ),
+        migrations.AlterField(
+            model_name='contact',
+            name='owner',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='contacts', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='contacttombstone',
+            name='owner',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='contact_tombstones', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='spamreport',
+            name='reporter',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='reported_spams', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
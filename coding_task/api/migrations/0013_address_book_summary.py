@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_counter_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AddressBookSummary',
+            fields=[
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='address_book_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('contacts', models.PositiveIntegerField(default=0)),
+                ('spam_contacts', models.PositiveIntegerField(default=0)),
+                ('reports_filed', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
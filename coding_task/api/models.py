@@ -1,14 +1,58 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import RegexValidator
+from .normalization import reverse_digits, normalize_name, phonetic_key
 
-class User(AbstractUser):
+
+
+class SearchKeysMixin:
+    """
+    Keeps derived, indexed search columns in sync with their source fields.
+
+    ``bulk_create()`` and ``QuerySet.update()`` bypass ``save()``, so code on
+    those paths must call ``refresh_search_keys()`` itself.
+    """
+    search_key_fields = ()
+
+    def refresh_search_keys(self):
+        """Recompute the ``search_key_fields`` from their sources; models with search keys override it."""
+
+    def save(self, *args, **kwargs):
+        self.refresh_search_keys()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], *self.search_key_fields}
+        super().save(*args, **kwargs)
+
+
+class User(SearchKeysMixin, AbstractUser):
     name = models.CharField(max_length=100, null=True, blank=True)
-    
+    name_normalized = models.CharField(max_length=100, blank=True, editable=False)
+    name_phonetic = models.CharField(max_length=100, blank=True, editable=False)
+
+    search_key_fields = ('name_normalized', 'name_phonetic')
+
     def __str__(self):
         return self.username
 
-class UserProfile(models.Model):
+    def refresh_search_keys(self):
+        self.name_normalized = normalize_name(self.name)[:100]
+        self.name_phonetic = phonetic_key(self.name)[:100]
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(
+                fields=['name_phonetic'],
+                name='api_user_name_phon_idx',
+                opclasses=['varchar_pattern_ops']
+            ),
+            models.Index(
+                fields=['name_normalized'],
+                name='api_user_name_norm_idx',
+                opclasses=['varchar_pattern_ops']
+            )
+        ]
+
+class UserProfile(SearchKeysMixin, models.Model):
     user = models.OneToOneField(
         User, 
         on_delete=models.CASCADE,
@@ -20,71 +64,287 @@ class UserProfile(models.Model):
     )
     phone_number = models.CharField(
         validators=[phone_regex],
-        max_length=10,
+        max_length=17,
         unique=True
     )
+    phone_reversed = models.CharField(max_length=17, blank=True, editable=False)
     email = models.EmailField(blank=True, null=True)
     spam_count = models.IntegerField(default=0)
-    
+
+    search_key_fields = ('phone_reversed',)
+
     def __str__(self):
         return f"{self.user.username} ({self.phone_number})"
 
+    def refresh_search_keys(self):
+        self.phone_reversed = reverse_digits(self.phone_number)
+
     class Meta:
+        # phone_number is unique, and its unique index serves the lookups
         indexes = [
-            models.Index(fields=['phone_number']),
-            models.Index(fields=['email'])
+            models.Index(fields=['email']),
+            models.Index(
+                fields=['phone_reversed'],
+                name='api_userpro_phone_rev_idx',
+                opclasses=['varchar_pattern_ops']
+            )
         ]
 
-class Contact(models.Model):
+class Contact(SearchKeysMixin, models.Model):
     owner = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='contacts'
+        related_name='contacts',
+        # Covered by the (owner, ...) indexes below
+        db_index=False
     )
     name = models.CharField(max_length=100)
     phone_number = models.CharField(max_length=17) 
+    phone_reversed = models.CharField(max_length=17, blank=True, editable=False)
+    name_normalized = models.CharField(max_length=100, blank=True, editable=False)
+    name_phonetic = models.CharField(max_length=100, blank=True, editable=False)
     spam_reported = models.BooleanField(default=False)
+    # The owner's change version at this row's last write, see sync.py
+    version = models.BigIntegerField(default=0, editable=False)
+
+    search_key_fields = ('phone_reversed', 'name_normalized', 'name_phonetic')
+
+    def save(self, *args, **kwargs):
+        from .sync import bump_version
+        # The version bump and the row must commit together, or a client
+        # could sync past a version whose row it has not seen yet
+        with transaction.atomic():
+            self.version = bump_version(self.owner_id)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+            super().save(*args, **kwargs)
+
+    def refresh_search_keys(self):
+        self.phone_reversed = reverse_digits(self.phone_number)
+        self.name_normalized = normalize_name(self.name)[:100]
+        self.name_phonetic = phonetic_key(self.name)[:100]
 
     @property
     def spam_likelihood(self):
-        total_users = UserProfile.objects.count()
-        if total_users == 0:
-            return "Low"
-        
-        spam_reports = SpamReport.objects.filter(
-            phone_number=self.phone_number
-        ).count()
-        
-        spam_percentage = (spam_reports / total_users) * 100
-        
-        if spam_percentage > 30:
-            return "Very High"
-        elif spam_percentage > 15:
-            return "High"
-        elif spam_percentage > 5:
-            return "Medium"
-        return "Low"
+        from .scoring import likelihood
+        return likelihood(self.phone_number)
 
     class Meta:
+        # (owner, phone_number) lookups use the unique_together index
         indexes = [
-            models.Index(fields=['name']),
-            models.Index(fields=['phone_number']),
-            models.Index(fields=['owner', 'phone_number'])
+            # Spam flag updates and name lookups by number
+            models.Index(
+                fields=['phone_number'],
+                include=['owner', 'name', 'spam_reported'],
+                name='api_contact_phone_cov_idx'
+            ),
+            models.Index(
+                fields=['phone_reversed'],
+                name='api_contact_phone_rev_idx',
+                opclasses=['varchar_pattern_ops']
+            ),
+            models.Index(
+                fields=['name_phonetic'],
+                name='api_contact_name_phon_idx',
+                opclasses=['varchar_pattern_ops']
+            ),
+            models.Index(
+                fields=['name_normalized'],
+                name='api_contact_name_norm_idx',
+                opclasses=['varchar_pattern_ops']
+            ),
+            # Per-owner filters and orderings of the contacts API. The default
+            # listing and the spam_reported=true filter are index-only scans
+            models.Index(
+                fields=['owner', 'id'],
+                include=['name', 'phone_number', 'spam_reported'],
+                name='api_contact_owner_cov_idx'
+            ),
+            models.Index(fields=['owner', 'name_normalized', 'id'], name='api_contact_owner_name_idx'),
+            models.Index(
+                fields=['owner', 'id'],
+                include=['name', 'phone_number'],
+                condition=models.Q(spam_reported=True),
+                name='api_contact_spam_cov_idx'
+            ),
+            models.Index(fields=['owner', 'version'], name='api_contact_owner_ver_idx')
         ]
         unique_together = ['owner', 'phone_number']
 
-class SpamReport(models.Model):
+class ContactSyncState(models.Model):
+    """
+    Per-user change counter for the contacts delta sync.
+
+    ``version`` is bumped, under the row's lock, by every write to the
+    user's contacts. Tombstones at or below ``pruned_version`` have been
+    deleted, so clients synced to an older version must resync in full.
+    """
+    owner = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='contact_sync'
+    )
+    version = models.BigIntegerField(default=0)
+    pruned_version = models.BigIntegerField(default=0)
+
+class ContactTombstone(models.Model):
+    """A deleted contact, kept so that delta sync can report the deletion."""
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='contact_tombstones',
+        # Covered by the (owner, version) index below
+        db_index=False
+    )
+    contact_id = models.BigIntegerField()
+    version = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'version'], name='api_tombstone_owner_ver_idx'),
+            models.Index(fields=['deleted_at'])
+        ]
+
+class AddressBookSummary(models.Model):
+    """
+    A user's address-book totals for the home screen (see summary.py).
+
+    Kept up to date in the transactions that change them, so reading the
+    summary is a one-row lookup.
+    """
+    owner = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='address_book_summary'
+    )
+    contacts = models.PositiveIntegerField(default=0)
+    spam_contacts = models.PositiveIntegerField(default=0)
+    reports_filed = models.PositiveIntegerField(default=0)
+
+class NameFrequency(models.Model):
+    """
+    How many address books save ``phone_number`` under ``name``.
+
+    Maintained incrementally from Contact signals so that phone lookups for
+    unregistered numbers read the top names from one index instead of
+    aggregating every Contact row for the number.
+    """
+    phone_number = models.CharField(max_length=17)
+    name = models.CharField(max_length=100)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['phone_number', '-count', 'name'], name='api_namefreq_rank_idx')
+        ]
+        unique_together = ['phone_number', 'name']
+
+class SpamReport(SearchKeysMixin, models.Model):
     reporter = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='reported_spams'
+        related_name='reported_spams',
+        # Covered by the (reporter, phone_number) unique index
+        db_index=False
     )
     phone_number = models.CharField(max_length=17)
+    phone_reversed = models.CharField(max_length=17, blank=True, editable=False)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    search_key_fields = ('phone_reversed',)
+
+    def refresh_search_keys(self):
+        self.phone_reversed = reverse_digits(self.phone_number)
+
     class Meta:
+        # (reporter, phone_number) lookups use the unique_together index
         indexes = [
-            models.Index(fields=['phone_number']),
-            models.Index(fields=['reporter', 'phone_number'])
+            # Report counts per number, and reports on a number after an id
+            # (with their reporters, for weighted counts), from the index alone
+            models.Index(fields=['phone_number', 'id'], include=['reporter'], name='api_spamrep_phone_id_idx'),
+            models.Index(
+                fields=['phone_reversed'],
+                name='api_spamrep_phone_rev_idx',
+                opclasses=['varchar_pattern_ops']
+            )
         ]
-        unique_together = ['reporter', 'phone_number']
\ No newline at end of file
+        unique_together = ['reporter', 'phone_number']
+
+class SpamRangeCount(models.Model):
+    """Reports on all numbers in one range, keyed by the range's digits with '*' for the rest (see ranges.py)."""
+    prefix = models.CharField(max_length=17, primary_key=True)
+    reports = models.PositiveIntegerField(default=0)
+
+class CounterShard(models.Model):
+    """One slot of a sharded counter; the counter's uncompacted total is the sum of its slots (see counters.py)."""
+    key = models.CharField(max_length=40)
+    slot = models.PositiveSmallIntegerField()
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['key', 'slot']
+
+class ReporterWeight(models.Model):
+    """How far a user's spam reports are trusted, from agreement with other reporters (see reputation.py)."""
+    reporter = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='reporter_weight'
+    )
+    weight = models.FloatField()
+    reports = models.PositiveIntegerField()
+
+class WeightedSpamScore(models.Model):
+    """Sum of reporter weights over a number's reports, as of ``SpamScoreRun.max_report_id``."""
+    phone_number = models.CharField(max_length=17, unique=True)
+    score = models.FloatField()
+    reports = models.PositiveIntegerField()
+    run = models.ForeignKey('SpamScoreRun', on_delete=models.CASCADE, related_name='+')
+
+class SpamScoreRun(models.Model):
+    """One run of the reputation batch job; scoring reads the latest finished one."""
+    max_report_id = models.BigIntegerField()
+    started = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+class RequestProfile(models.Model):
+    """
+    A staff-requested profile of one API request (see profiling.py).
+
+    Kept as a ring buffer: only the newest ``PROFILING['KEEP']`` rows survive.
+    """
+    created = models.DateTimeField(auto_now_add=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2000)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    sql_count = models.PositiveIntegerField()
+    sql_ms = models.FloatField()
+    call_stats = models.TextField(blank=True)
+    # [{'sql', 'params', 'ms', 'plan'}], in execution order
+    queries = models.JSONField(default=list)
+
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.duration_ms:.0f} ms)'
+
+class QueryFingerprint(models.Model):
+    """Aggregate cost of one normalized SQL statement, kept by the slow-query log (see slowlog.py)."""
+    fingerprint = models.CharField(max_length=40, unique=True)
+    sql = models.TextField()
+    calls = models.BigIntegerField(default=0)
+    slow_calls = models.BigIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    plan = models.TextField(blank=True)
+    plan_ms = models.FloatField(null=True, blank=True)
+    plan_captured_at = models.DateTimeField(null=True, blank=True)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.sql[:100]
@@ -0,0 +1,82 @@
+import re
+import unicodedata
+
+NON_DIGITS = re.compile(r'\D')
+NON_WORD = re.compile(r'[^\w]')
+
+
+def digits_only(phone_number):
+    return NON_DIGITS.sub('', phone_number or '')
+
+
+def reverse_digits(phone_number):
+    """
+    Reversed digit string of a phone number ('+91 98765-43210' -> '01234567891989').
+
+    Stored in an indexed column so that "number ends with 43210" becomes a
+    B-tree prefix range scan on '01234' instead of a full ``LIKE '%43210'`` scan.
+    """
+    return digits_only(phone_number)[::-1]
+
+
+SOUNDEX_CODES = {
+    **dict.fromkeys('bfpv', '1'),
+    **dict.fromkeys('cgjkqsxz', '2'),
+    **dict.fromkeys('dt', '3'),
+    'l': '4',
+    **dict.fromkeys('mn', '5'),
+    'r': '6',
+}
+
+
+def normalize_name(name):
+    """Case-folded, accent-stripped name with punctuation removed ('  José O'Neil' -> 'jose oneil')."""
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(NON_WORD.sub('', token) for token in stripped.casefold().split()).strip()
+
+
+def soundex(token):
+    letters = [c for c in token if 'a' <= c <= 'z']
+    if not letters:
+        return ''
+
+    code = letters[0].upper()
+    previous = SOUNDEX_CODES.get(letters[0], '')
+    for letter in letters[1:]:
+        digit = SOUNDEX_CODES.get(letter, '')
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        # 'h' and 'w' do not separate letters with the same code; vowels do
+        if letter not in 'hw':
+            previous = digit
+    return code.ljust(4, '0')
+
+
+def phonetic_key(name):
+    """
+    Space-separated Soundex codes of the name's tokens ('Jon Doe' -> 'J500 D000').
+
+    'Jon', 'Jhon' and 'John' share a key, so a prefix match on the stored key
+    finds spelling variants without computing edit distances over the table.
+    """
+    return ' '.join(filter(None, (soundex(token) for token in normalize_name(name).split())))
+
+
+def edit_distance(a, b):
+    """Levenshtein distance between two short strings."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        previous = current
+    return previous[-1]
@@ -0,0 +1,120 @@
+import cProfile
+import io
+import pstats
+import random
+import time
+
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .instrumentation import QueryLog, explain
+from .models import RequestProfile
+
+DEFAULTS = {
+    'QUERY_PARAM': '_profile',
+    'HEADER': 'HTTP_X_PROFILE',
+    # Profiles kept; older ones are deleted as new ones are saved
+    'KEEP': 200,
+    # Functions listed in the call stats, by cumulative time
+    'CALL_STATS_LIMIT': 60,
+    # Share of profiled requests whose slowest queries get EXPLAIN ANALYZE
+    'EXPLAIN_SAMPLE_RATE': 0.25,
+    'EXPLAIN_SLOWEST': 3,
+}
+
+
+def get_profiling_setting(name):
+    return getattr(settings, 'PROFILING', {}).get(name, DEFAULTS[name])
+
+
+def profile_requested(request):
+    """'1' for a profile, 'explain' to also force query plans, or None."""
+    value = request.GET.get(get_profiling_setting('QUERY_PARAM')) or request.META.get(get_profiling_setting('HEADER'))
+    return value if value in ('1', 'explain') else None
+
+
+def staff_user(request):
+    """The staff user behind a session or a bearer token, else None."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        try:
+            authenticated = JWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return None
+        user = authenticated[0] if authenticated else None
+    return user if user is not None and user.is_staff else None
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a request when a staff user asks with ``?_profile=1`` or an
+    ``X-Profile: 1`` header (``explain`` instead of ``1`` always captures
+    query plans).
+
+    The request runs under cProfile with every SQL statement timed through
+    ``execute_wrapper``; the result is stored as a ``RequestProfile`` and its
+    id returned in the ``X-Profile-Id`` response header. Requests without
+    the flag only pay for the flag lookup.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = profile_requested(request)
+        if mode is None:
+            return self.get_response(request)
+        user = staff_user(request)
+        if user is None:
+            return self.get_response(request)
+
+        query_log = QueryLog()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with query_log.capture():
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        explain_plans = mode == 'explain' or random.random() < get_profiling_setting('EXPLAIN_SAMPLE_RATE')
+        profile = save_profile(request, response, user, duration_ms, query_log, profiler, explain_plans)
+        response['X-Profile-Id'] = str(profile.pk)
+        return response
+
+
+def format_call_stats(profiler):
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(get_profiling_setting('CALL_STATS_LIMIT'))
+    return out.getvalue()
+
+
+def save_profile(request, response, user, duration_ms, query_log, profiler, explain_plans):
+    plans = {}
+    if explain_plans:
+        for query in query_log.slowest(get_profiling_setting('EXPLAIN_SLOWEST')):
+            if not query['many']:
+                plans[id(query)] = explain(query['sql'], query['params'], query['using'], analyze=True)
+
+    profile = RequestProfile.objects.create(
+        user=user,
+        method=request.method,
+        path=request.get_full_path()[:2000],
+        status_code=response.status_code,
+        duration_ms=duration_ms,
+        sql_count=len(query_log.queries),
+        sql_ms=query_log.total_ms,
+        call_stats=format_call_stats(profiler),
+        queries=[{
+            'sql': query['sql'],
+            'params': [str(param) for param in query['params'] or ()],
+            'ms': round(query['ms'], 3),
+            'plan': plans.get(id(query)),
+        } for query in query_log.queries],
+    )
+    RequestProfile.objects.filter(pk__lte=profile.pk - get_profiling_setting('KEEP')).delete()
+    return profile
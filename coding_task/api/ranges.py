@@ -0,0 +1,119 @@
+"""
+Spam report counts per number range, for scoring numbers nobody has reported.
+
+Spammers work through consecutive numbers, so a number whose own count is
+zero can still sit in a range that collects reports. Every report adds one
+to a ``SpamRangeCount`` row per level of ``LEVELS``: the number with its last
+3, 4 and 6 digits wildcarded, i.e. its 1k and 10k ranges and its operator
+block ('+91 98765 43210' counts towards '919876543***', '91987654****' and
+'919876******').
+
+Keys are cut from the end of the number, so they need no numbering plan and
+numbers of any length and country code line up. A lookup is one query: an
+``IN`` read over the ``len(LEVELS)`` keys of each number on the totals' primary
+key and on the shards' (key, slot) index.
+
+A busy range would make every report in it wait on one row, so reports go
+to sharded counters (counters.py) that are compacted into the totals.
+"""
+from collections import Counter
+
+import numpy as np
+from django.db import connection
+from django.db.models import F
+
+from .counters import increment, shard_values
+from .models import SpamRangeCount
+from .normalization import digits_only
+
+# (wildcarded trailing digits, prior per report in the range). A range whose
+# reports add up to less than one report's worth is ignored, so a 1k range
+# needs 5 reports and an operator block 500 before its numbers score above Low
+LEVELS = (
+    (3, 0.2),
+    (4, 0.05),
+    (6, 0.002),
+)
+# Digits a key keeps at least, so short numbers do not share one range
+MIN_PREFIX_DIGITS = 4
+COUNTER_NAMESPACE = 'r'
+# Range rows written per statement by add_range_totals
+UPSERT_BATCH = 1000
+
+
+def range_keys(phone_number):
+    """``SpamRangeCount`` keys of the ranges containing ``phone_number``, with their prior weights."""
+    digits = digits_only(phone_number)
+    return [
+        (digits[:-wildcards] + '*' * wildcards, weight)
+        for wildcards, weight in LEVELS
+        if len(digits) - wildcards >= MIN_PREFIX_DIGITS
+    ]
+
+
+def range_changes(phone_numbers, delta=1):
+    """``{range key: delta}`` for ``delta`` reports on each of ``phone_numbers``."""
+    changes = Counter()
+    for phone_number in phone_numbers:
+        for key, _ in range_keys(phone_number):
+            changes[key] += delta
+    return changes
+
+
+def add_range_reports(phone_numbers, delta=1):
+    """
+    Add ``delta`` reports for each of ``phone_numbers`` to their ranges,
+    through the sharded counters. Call inside the report's transaction.
+    """
+    increment({f'{COUNTER_NAMESPACE}:{key}': n for key, n in range_changes(phone_numbers, delta).items()})
+
+
+def add_range_totals(changes):
+    """Write ``{range key: delta}`` to ``SpamRangeCount`` directly (compaction and bulk loads)."""
+    # Sorted, so concurrent writers lock range rows in the same order
+    added = sorted((key, delta) for key, delta in changes.items() if delta > 0)
+    for start in range(0, len(added), UPSERT_BATCH):
+        _upsert(added[start:start + UPSERT_BATCH])
+    for key in sorted(key for key, delta in changes.items() if delta < 0):
+        rows = SpamRangeCount.objects.filter(prefix=key)
+        rows.update(reports=F('reports') + changes[key])
+        rows.filter(reports__lte=0).delete()
+
+
+def _upsert(rows):
+    # One statement per batch; the ORM cannot add to the existing value on conflict
+    table = connection.ops.quote_name(SpamRangeCount._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (prefix, reports) VALUES {', '.join(['(%s, %s)'] * len(rows))} "
+            f'ON CONFLICT (prefix) DO UPDATE SET reports = {table}.reports + excluded.reports',
+            [value for row in rows for value in row]
+        )
+
+
+def range_count_rows(keys):
+    """``(key, reports)`` rows of the totals and the uncompacted shards of range ``keys``, as one query."""
+    totals = SpamRangeCount.objects.filter(prefix__in=keys).values_list('prefix', 'reports')
+    return totals.union(shard_values([f'{COUNTER_NAMESPACE}:{key}' for key in keys]), all=True)
+
+
+def range_priors(phone_numbers):
+    """
+    Range-based report counts aligned with ``phone_numbers``.
+
+    Each number gets the strongest signal among its ranges: the range's
+    report count times its level's weight, if that comes to at least 1.
+    """
+    phone_numbers = list(phone_numbers)
+    keys = [range_keys(phone_number) for phone_number in phone_numbers]
+    wanted = {key for number_keys in keys for key, _ in number_keys}
+    found = Counter()
+    if wanted:
+        for key, reports in range_count_rows(wanted):
+            found[key.rpartition(':')[2]] += reports
+    priors = np.zeros(len(phone_numbers))
+    for i, number_keys in enumerate(keys):
+        prior = max((found.get(key, 0) * weight for key, weight in number_keys), default=0)
+        if prior >= 1:
+            priors[i] = prior
+    return priors
@@ -0,0 +1,100 @@
+"""
+Compact response formats for mobile clients.
+
+Besides JSON, the API views mixing in ``CompactFormatsMixin`` speak
+MessagePack (``application/msgpack``) and, where ``cbor2`` is installed,
+CBOR (``application/cbor``), both ways, picked by ``Accept`` and
+``Content-Type``. ``?shape=columns`` turns list responses into one array of
+values per field, so each key is sent once instead of once per row.
+"""
+import msgpack
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+# Dates, decimals, UUIDs and lazy strings are encoded as they are in JSON
+_encoder = JSONEncoder()
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_encoder.default)
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
+
+
+class CBORRenderer(BaseRenderer):
+    media_type = 'application/cbor'
+    format = 'cbor'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return cbor2.dumps(data, default=lambda encoder, value: encoder.encode(_encoder.default(value)))
+
+
+class CBORParser(BaseParser):
+    media_type = 'application/cbor'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return cbor2.loads(stream.read())
+        except (ValueError, cbor2.CBORDecodeError) as exc:
+            raise ParseError(f'CBOR parse error - {exc}')
+
+
+COMPACT_RENDERER_CLASSES = [MessagePackRenderer] + ([CBORRenderer] if cbor2 else [])
+COMPACT_PARSER_CLASSES = [MessagePackParser] + ([CBORParser] if cbor2 else [])
+
+
+def columnar(rows):
+    """``[{'a': 1, 'b': 2}, {'a': 3, 'b': 4}]`` -> ``{'a': [1, 3], 'b': [2, 4]}``; missing values are None."""
+    fields = list(dict.fromkeys(field for row in rows for field in row))
+    return {field: [row.get(field) for row in rows] for field in fields}
+
+
+class CompactFormatsMixin:
+    """
+    Adds the compact renderers and parsers to a view, after the default
+    ones so JSON stays the default, and the ``?shape=columns`` option.
+    """
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, *COMPACT_RENDERER_CLASSES]
+    parser_classes = [*api_settings.DEFAULT_PARSER_CLASSES, *COMPACT_PARSER_CLASSES]
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.query_params.get('shape') == 'columns' and response.status_code == 200:
+            data = response.data
+            if _is_rows(data):
+                response.data = columnar(data)
+            elif isinstance(data, dict) and _is_rows(data.get('results')):
+                response.data = {**data, 'results': columnar(data['results'])}
+        return response
+
+
+def _is_rows(value):
+    return isinstance(value, list) and all(isinstance(row, dict) for row in value)
@@ -0,0 +1,56 @@
+"""
+Filing a spam report, and the counters that follow reports.
+
+A report on a number flags the contacts holding it, adds to the number's
+``UserProfile.spam_count`` and to its ranges (ranges.py). The counts go
+through sharded counters, so reports on one viral number do not queue on
+its profile row; ``compact_counters()`` writes them to the totals.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from .counters import compact, increment
+from .models import Contact, SpamReport, UserProfile
+from .ranges import COUNTER_NAMESPACE as RANGE_COUNTERS, add_range_totals, range_changes
+from .summary import add_to_summaries
+from .sync import set_spam_flag
+
+SPAM_COUNTS = 'n'
+
+
+def record_spam_report(reporter, phone_number):
+    """
+    File a report of ``phone_number`` by ``reporter``.
+
+    Raises ``IntegrityError`` if the reporter has already reported the
+    number; nothing is changed then.
+    """
+    with transaction.atomic():
+        # Range counters are incremented by the post_save signal
+        report = SpamReport.objects.create(reporter=reporter, phone_number=phone_number)
+        set_spam_flag(Contact.objects.filter(phone_number=phone_number), True)
+        increment({f'{SPAM_COUNTS}:{phone_number}': 1})
+    return report
+
+
+def count_bulk_reports(reporter, phone_numbers):
+    """
+    Everything ``record_spam_report`` updates, for a report by ``reporter``
+    on each of ``phone_numbers`` inserted in bulk (which skips signals), in a
+    few set-based statements. Call inside the insert's transaction.
+    """
+    add_to_summaries({reporter.id: {'reports_filed': len(phone_numbers)}})
+    set_spam_flag(Contact.objects.filter(phone_number__in=phone_numbers), True)
+    UserProfile.objects.filter(phone_number__in=phone_numbers).update(spam_count=F('spam_count') + 1)
+    add_range_totals(range_changes(phone_numbers))
+
+
+def add_profile_spam_counts(changes):
+    """Add ``{phone_number: delta}`` to ``UserProfile.spam_count``; numbers nobody registered are skipped."""
+    for phone_number in sorted(changes):
+        UserProfile.objects.filter(phone_number=phone_number).update(spam_count=F('spam_count') + changes[phone_number])
+
+
+def compact_counters():
+    """Fold all report counters into their totals; returns the number of totals changed."""
+    return compact(SPAM_COUNTS, add_profile_spam_counts) + compact(RANGE_COUNTERS, add_range_totals)
@@ -0,0 +1,211 @@
+"""
+Reporter reputation weights and weighted per-number spam scores.
+
+A report counts for as much as its reporter is trusted, and a reporter is
+trusted as far as other reporters agree with them. Starting from equal
+weights, each iteration
+
+1. scores every number as the summed weight of its reporters, and
+2. re-weights every reporter by how corroborated their reports are: for
+   each report, the weight the *other* reporters of that number put on it,
+   relative to ``CORROBORATION``, capped at 1, then averaged with a prior
+   of ``PRIOR_WEIGHT`` worth ``PRIOR_REPORTS`` reports.
+
+An account that reports numbers nobody else reports drifts toward
+``MIN_WEIGHT``; ordinary reporters of genuine spam stay near 1.
+
+The reporter x number matrix is never built. Its non-zeros (one per
+report) are streamed once, ordered by number, into two memory-mapped
+columns on disk, and every pass reads them in ``CHUNK_SIZE`` slices with
+``numpy.bincount`` doing the sparse products. Resident memory is one
+float per reporter id and per number plus one chunk.
+"""
+import os
+import tempfile
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Max, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ReporterWeight, SpamReport, SpamScoreRun, WeightedSpamScore
+
+ITERATIONS = 5
+CHUNK_SIZE = 1_000_000
+CORROBORATION = 2.0
+PRIOR_WEIGHT = 1.0
+PRIOR_REPORTS = 2
+MIN_WEIGHT = 0.05
+WRITE_BATCH = 5000
+
+
+class ReportMatrix:
+    """
+    Report pairs as memory-mapped (reporter id, number index) columns, with
+    the numbers themselves written one per line to a file in index order.
+    """
+
+    def __init__(self, directory, max_report_id, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        reports = SpamReport.objects.filter(id__lte=max_report_id)
+        capacity = max(reports.count(), 1)
+        self.reporters = np.memmap(os.path.join(directory, 'reporters'), dtype=np.int64, mode='w+', shape=(capacity,))
+        self.numbers = np.memmap(os.path.join(directory, 'numbers'), dtype=np.int64, mode='w+', shape=(capacity,))
+        self.phone_path = os.path.join(directory, 'phone_numbers')
+
+        # Ordered by number, so a number's index is assigned on first sight
+        # and no phone -> index map is held in memory
+        rows = reports.order_by('phone_number').values_list('phone_number', 'reporter_id').iterator(chunk_size=50000)
+        self.size = 0
+        self.number_count = 0
+        current = None
+        reporter_buffer, number_buffer = [], []
+        with open(self.phone_path, 'w') as phones:
+            for phone_number, reporter_id in rows:
+                if phone_number != current:
+                    current = phone_number
+                    phones.write(phone_number + '\n')
+                    self.number_count += 1
+                reporter_buffer.append(reporter_id)
+                number_buffer.append(self.number_count - 1)
+                if len(reporter_buffer) >= chunk_size:
+                    self._append(reporter_buffer, number_buffer)
+                    reporter_buffer, number_buffer = [], []
+            self._append(reporter_buffer, number_buffer)
+
+        self.reporter_count = int(self.reporters[:self.size].max()) + 1 if self.size else 0
+        self.reporter_reports = np.zeros(self.reporter_count)
+        self.number_reports = np.zeros(self.number_count, dtype=np.int64)
+        for reporters, numbers in self.chunks():
+            self.reporter_reports += np.bincount(reporters, minlength=self.reporter_count)
+            self.number_reports += np.bincount(numbers, minlength=self.number_count)
+
+    def _append(self, reporters, numbers):
+        # Reports added between the count and the export are left for the next run
+        n = min(len(reporters), len(self.reporters) - self.size)
+        self.reporters[self.size:self.size + n] = reporters[:n]
+        self.numbers[self.size:self.size + n] = numbers[:n]
+        self.size += n
+
+    def chunks(self):
+        for start in range(0, self.size, self.chunk_size):
+            end = min(start + self.chunk_size, self.size)
+            yield np.asarray(self.reporters[start:end]), np.asarray(self.numbers[start:end])
+
+    def phone_numbers(self):
+        with open(self.phone_path) as phones:
+            for line in phones:
+                yield line.rstrip('\n')
+
+    def scores(self, weights):
+        """Summed reporter weight per number: the sparse product A^T w."""
+        scores = np.zeros(self.number_count)
+        for reporters, numbers in self.chunks():
+            scores += np.bincount(numbers, weights=weights[reporters], minlength=self.number_count)
+        return scores
+
+    def reweight(self, weights, scores):
+        agreement = np.zeros(self.reporter_count)
+        for reporters, numbers in self.chunks():
+            others = scores[numbers] - weights[reporters]
+            agreement += np.bincount(
+                reporters, weights=np.minimum(others / CORROBORATION, 1.0), minlength=self.reporter_count
+            )
+        weights = (PRIOR_REPORTS * PRIOR_WEIGHT + agreement) / (PRIOR_REPORTS + self.reporter_reports)
+        return np.clip(weights, MIN_WEIGHT, 1.0)
+
+
+def compute_weights(matrix, iterations=ITERATIONS):
+    weights = np.ones(matrix.reporter_count)
+    scores = matrix.scores(weights)
+    for _ in range(iterations):
+        weights = matrix.reweight(weights, scores)
+        scores = matrix.scores(weights)
+    return weights, scores
+
+
+def write_scores(scores):
+    WeightedSpamScore.objects.bulk_create(
+        scores, update_conflicts=True, unique_fields=['phone_number'], update_fields=['score', 'reports', 'run']
+    )
+
+
+def run_batch(iterations=ITERATIONS, chunk_size=CHUNK_SIZE, directory=None, log=None):
+    """Recompute reporter weights and weighted scores for all reports; returns the run."""
+    max_report_id = SpamReport.objects.aggregate(m=Max('id'))['m'] or 0
+    run = SpamScoreRun.objects.create(max_report_id=max_report_id)
+
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        matrix = ReportMatrix(tmp, max_report_id, chunk_size)
+        if log:
+            log(f'{matrix.size} reports on {matrix.number_count} numbers')
+        weights, scores = compute_weights(matrix, iterations)
+
+        reporter_ids = np.flatnonzero(matrix.reporter_reports)
+        for start in range(0, len(reporter_ids), WRITE_BATCH):
+            ReporterWeight.objects.bulk_create(
+                [
+                    ReporterWeight(reporter_id=int(i), weight=float(weights[i]), reports=int(matrix.reporter_reports[i]))
+                    for i in reporter_ids[start:start + WRITE_BATCH]
+                ],
+                update_conflicts=True, unique_fields=['reporter'], update_fields=['weight', 'reports']
+            )
+        if log:
+            log(f'{len(reporter_ids)} reporter weights written')
+
+        batch = []
+        for j, phone_number in enumerate(matrix.phone_numbers()):
+            batch.append(WeightedSpamScore(
+                phone_number=phone_number, score=float(scores[j]), reports=int(matrix.number_reports[j]), run=run
+            ))
+            if len(batch) >= WRITE_BATCH:
+                write_scores(batch)
+                batch = []
+        write_scores(batch)
+        if log:
+            log(f'{matrix.number_count} number scores written')
+
+    with transaction.atomic():
+        # Numbers without reports any more
+        WeightedSpamScore.objects.filter(run_id__lt=run.id).delete()
+        SpamScoreRun.objects.filter(id__lt=run.id).delete()
+        run.finished = timezone.now()
+        run.save(update_fields=['finished'])
+    return run
+
+
+def weighted_counts(phone_numbers):
+    """
+    Weighted report totals aligned with ``phone_numbers``.
+
+    The stored score covers reports up to its run's ``max_report_id``;
+    later reports are added with their reporter's current weight (1 for
+    reporters the job has not weighed yet). Numbers without a stored score
+    are summed entirely that way.
+    """
+    phone_numbers = list(phone_numbers)
+    stored = {
+        phone_number: (score, max_report_id)
+        for phone_number, score, max_report_id in WeightedSpamScore.objects.filter(
+            phone_number__in=set(phone_numbers)
+        ).values_list('phone_number', 'score', 'run__max_report_id')
+    }
+
+    # Scores come from at most a couple of runs, so group numbers by cut-off
+    by_cutoff = {}
+    for phone_number in set(phone_numbers):
+        by_cutoff.setdefault(stored.get(phone_number, (0, 0))[1], []).append(phone_number)
+    newer = {}
+    for cutoff, numbers in by_cutoff.items():
+        newer.update(
+            SpamReport.objects.filter(phone_number__in=numbers, id__gt=cutoff)
+            .values('phone_number')
+            .annotate(w=Sum(Coalesce(F('reporter__reporter_weight__weight'), Value(1.0))))
+            .order_by()
+            .values_list('phone_number', 'w')
+        )
+
+    return np.fromiter(
+        (stored.get(n, (0, 0))[0] + newer.get(n, 0) for n in phone_numbers), dtype=float, count=len(phone_numbers)
+    )
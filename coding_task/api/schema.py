@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+import threading
+
+from django.conf import settings
+from django.utils import translation
+from drf_spectacular.renderers import OpenApiJsonRenderer
+from drf_spectacular.views import SpectacularAPIView
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def get_schema_artifact_path():
+    return getattr(settings, 'SCHEMA_ARTIFACT_PATH', None) or os.path.join(
+        settings.BASE_DIR, 'schema.json'
+    )
+
+
+def render_schema(schema):
+    return OpenApiJsonRenderer().render(schema, renderer_context={})
+
+
+class CachedSchemaView(SpectacularAPIView):
+    """
+    OpenAPI schema served from the artifact written by ``manage.py generate_schema``.
+
+    When no artifact exists the schema is generated on the first request and
+    memoized for the life of the process. Responses carry a strong ETag so
+    clients revalidate with ``If-None-Match`` instead of re-downloading.
+
+    Access is checked as by ``SpectacularAPIView`` (``SERVE_PERMISSIONS``).
+    The artifact and the memoized schema are public, so without
+    ``SERVE_PUBLIC`` the schema is generated per request for the user.
+    """
+    _schemas = {}
+    _lock = threading.Lock()
+
+    def _get_schema_response(self, request):
+        if not self.serve_public:
+            return super()._get_schema_response(request)
+        version = self.api_version or request.version or self._get_version_parameter(request)
+        key = (version, translation.get_language() if request.GET.get('lang') else None)
+
+        with self._lock:
+            if key not in self._schemas:
+                self._schemas[key] = self._load_schema(request, version, key)
+            schema, digest = self._schemas[key]
+
+        etag = f'"{digest}-{request.accepted_renderer.format}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        return Response(
+            data=schema,
+            headers={
+                'ETag': etag,
+                'Content-Disposition': f'inline; filename="{self._get_filename(request, version)}"',
+            }
+        )
+
+    def _load_schema(self, request, version, key):
+        path = get_schema_artifact_path()
+        if key == (None, None) and os.path.exists(path):
+            with open(path, 'rb') as f:
+                content = f.read()
+            schema = json.loads(content)
+        else:
+            generator = self.generator_class(
+                urlconf=self.urlconf, api_version=version, patterns=self.patterns
+            )
+            schema = generator.get_schema(request=request, public=self.serve_public)
+            content = render_schema(schema)
+        return schema, hashlib.sha256(content).hexdigest()[:32]
@@ -0,0 +1,154 @@
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count
+from django.utils.module_loading import import_string
+
+from .models import SpamReport, UserProfile
+from .ranges import range_priors
+from .reputation import weighted_counts
+from .snapshot import snapshot_counts
+
+LABELS = np.array(['Low', 'Medium', 'High', 'Very High'], dtype=object)
+
+DEFAULTS = {
+    'POLICY': 'absolute',
+    'THRESHOLDS': None,
+    'POPULATION_TTL': 300,
+    # Weigh reports by reporter reputation (needs the compute_reporter_weights job)
+    'WEIGHTED': False,
+    # Score unreported numbers by the reports on their number ranges
+    'RANGE_PRIOR': True,
+}
+
+
+def get_scoring_setting(name):
+    return getattr(settings, 'SPAM_SCORING', {}).get(name, DEFAULTS[name])
+
+
+class PopulationCache:
+    """Registered-user count, refreshed at most once per ``POPULATION_TTL`` seconds."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = None
+        self._expires = 0
+
+    def get(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._value is None or now >= self._expires:
+                self._value = UserProfile.objects.count()
+                self._expires = now + get_scoring_setting('POPULATION_TTL')
+            return self._value
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+
+
+population = PopulationCache()
+
+
+class ThresholdPolicy:
+    """
+    Maps spam report counts to likelihood labels.
+
+    A value above ``thresholds[i]`` (and not above ``thresholds[i + 1]``)
+    gets ``LABELS[i + 1]``; the whole batch is labelled with one
+    ``searchsorted`` call.
+    """
+    thresholds = ()
+
+    def __init__(self, thresholds=None):
+        self.thresholds = np.asarray(thresholds or self.thresholds, dtype=float)
+
+    def values(self, counts):
+        return counts
+
+    def labels(self, counts):
+        values = self.values(np.asarray(counts, dtype=float))
+        return LABELS[np.searchsorted(self.thresholds, values, side='left')]
+
+
+class AbsolutePolicy(ThresholdPolicy):
+    """Thresholds on the raw number of reports."""
+    thresholds = (0, 2, 5)
+
+
+class RelativePolicy(ThresholdPolicy):
+    """Thresholds on reports as a percentage of registered users."""
+    thresholds = (5, 15, 30)
+
+    def values(self, counts):
+        total_users = population.get()
+        if total_users == 0:
+            return np.zeros_like(counts)
+        return counts * (100.0 / total_users)
+
+
+POLICIES = {
+    'absolute': AbsolutePolicy,
+    'relative': RelativePolicy,
+}
+
+
+def get_policy():
+    name = get_scoring_setting('POLICY')
+    policy_class = POLICIES[name] if name in POLICIES else import_string(name)
+    return policy_class(get_scoring_setting('THRESHOLDS'))
+
+
+def spam_counts(phone_numbers):
+    """
+    Report counts aligned with ``phone_numbers``.
+
+    Weighted by reporter reputation when ``WEIGHTED`` is set. Otherwise read
+    from the shared spam snapshot when one is enabled, or fetched with one
+    grouped query.
+    """
+    phone_numbers = list(phone_numbers)
+    if get_scoring_setting('WEIGHTED'):
+        return weighted_counts(phone_numbers)
+    counts = snapshot_counts(phone_numbers)
+    if counts is not None:
+        return counts
+
+    found = dict(
+        SpamReport.objects.filter(phone_number__in=set(phone_numbers))
+        .values('phone_number')
+        .annotate(n=Count('id'))
+        .values_list('phone_number', 'n')
+    ) if phone_numbers else {}
+    return np.fromiter((found.get(n, 0) for n in phone_numbers), dtype=np.int64, count=len(phone_numbers))
+
+
+def likelihoods_for_counts(counts):
+    return get_policy().labels(counts).tolist()
+
+
+def scoring_counts(phone_numbers):
+    """
+    ``spam_counts`` with numbers that have no reports of their own scored
+    by their ranges instead, when ``RANGE_PRIOR`` is set.
+    """
+    phone_numbers = list(phone_numbers)
+    counts = spam_counts(phone_numbers)
+    if not get_scoring_setting('RANGE_PRIOR'):
+        return counts
+    unreported = np.flatnonzero(counts == 0)
+    if not len(unreported):
+        return counts
+    counts = counts.astype(float)
+    counts[unreported] = range_priors(phone_numbers[i] for i in unreported)
+    return counts
+
+
+def likelihoods(phone_numbers):
+    return likelihoods_for_counts(scoring_counts(phone_numbers))
+
+
+def likelihood(phone_number):
+    return likelihoods([phone_number])[0]
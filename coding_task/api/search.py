@@ -0,0 +1,142 @@
+import re
+
+from django.db.models import Count, F, Q
+
+from .models import UserProfile, Contact, NameFrequency, SpamReport
+from .normalization import reverse_digits, normalize_name, phonetic_key, edit_distance
+
+PHONE_SUFFIX_MIN_DIGITS = 4
+PHONE_SUFFIX_LIMIT = 20
+# How many distinct numbers each source may contribute before ranking
+PHONE_SUFFIX_CANDIDATES = 100
+SAVED_NAMES_LIMIT = 5
+FUZZY_LIMIT = 20
+# Rows fetched per source by phonetic key before edit-distance re-ranking
+FUZZY_CANDIDATES = 200
+PHONE_QUERY = re.compile(r'\+?[\d\s().-]*\d[\d\s().-]*')
+
+
+def saved_names(phone_number, limit=SAVED_NAMES_LIMIT):
+    """
+    The names a number is most often saved under, most popular first.
+
+    The first entry is the canonical name. This is a single read of the
+    (phone_number, -count, name) index no matter how many contacts hold the number.
+    """
+    return list(
+        NameFrequency.objects.filter(phone_number=phone_number)
+        .order_by('-count', 'name')
+        .values('name', 'phone_number', contact_count=F('count'))[:limit]
+    )
+
+
+def phone_suffix_matches(query, limit=PHONE_SUFFIX_LIMIT):
+    """
+    Numbers ending with the digits in ``query``, ranked by spam reports and
+    then by how many address books contain them.
+
+    Every lookup is a prefix range scan on an indexed ``phone_reversed``
+    column, and each source is capped, so the cost is bounded by the number
+    of matching rows rather than the table size.
+    """
+    key = reverse_digits(query)
+
+    contact_counts = dict(
+        Contact.objects.filter(phone_reversed__startswith=key)
+        .values('phone_number')
+        .annotate(n=Count('id'))
+        .order_by('-n')
+        .values_list('phone_number', 'n')[:PHONE_SUFFIX_CANDIDATES]
+    )
+    spam_counts = dict(
+        SpamReport.objects.filter(phone_reversed__startswith=key)
+        .values('phone_number')
+        .annotate(n=Count('id'))
+        .order_by('-n')
+        .values_list('phone_number', 'n')[:PHONE_SUFFIX_CANDIDATES]
+    )
+    registered = dict(
+        UserProfile.objects.filter(phone_reversed__startswith=key)
+        .values_list('phone_number', 'user__name')[:PHONE_SUFFIX_CANDIDATES]
+    )
+
+    numbers = sorted(
+        set(contact_counts) | set(spam_counts) | set(registered),
+        key=lambda number: (-spam_counts.get(number, 0), -contact_counts.get(number, 0), number)
+    )[:limit]
+
+    # Unregistered numbers are shown under the name most users saved them as
+    canonical_names = {}
+    for number, name in (
+        NameFrequency.objects.filter(phone_number__in=[n for n in numbers if n not in registered])
+        .order_by('-count', 'name')
+        .values_list('phone_number', 'name')
+    ):
+        canonical_names.setdefault(number, name)
+
+    return [{
+        'name': registered[number] if number in registered else canonical_names.get(number),
+        'phone_number': number,
+        'is_registered': number in registered,
+        'contact_count': contact_counts.get(number, 0),
+    } for number in numbers]
+
+
+def fuzzy_name_matches(query, limit=FUZZY_LIMIT):
+    """
+    Names that sound like ``query`` ('Jon' finds 'John' and 'Jhon'), closest
+    first, as ``{'name', 'phone_number'}`` rows.
+
+    Candidates come from an indexed prefix match on the precomputed phonetic
+    key, so only a bounded candidate set is re-ranked by edit distance.
+    """
+    key = phonetic_key(query)
+    if not key:
+        return []
+    normalized_query = normalize_name(query)
+    query_tokens = len(normalized_query.split())
+
+    candidates = [
+        (name, normalized, phone_number, True)
+        for name, normalized, phone_number in UserProfile.objects.filter(
+            user__name_phonetic__startswith=key
+        ).values_list('user__name', 'user__name_normalized', 'phone_number')[:FUZZY_CANDIDATES]
+    ] + [
+        (name, normalized, phone_number, False)
+        for name, normalized, phone_number in Contact.objects.filter(
+            name_phonetic__startswith=key
+        ).values_list('name', 'name_normalized', 'phone_number')[:FUZZY_CANDIDATES]
+    ]
+
+    ranked = []
+    for name, normalized, phone_number, is_registered in candidates:
+        # Compare against as many leading tokens as the query has, so 'jon'
+        # scores against 'john' rather than the whole of 'john doe'
+        leading = ' '.join(normalized.split()[:query_tokens])
+        ranked.append((edit_distance(normalized_query, leading), not is_registered, name, phone_number))
+
+    ranked.sort(key=lambda match: match[:3])
+    return [{'name': name, 'phone_number': phone_number} for _, _, name, phone_number in ranked[:limit]]
+
+
+def indexed_filter(query, phone_field=None, name_field=None, prefix_fields=()):
+    """
+    Q object for ``query`` that only compares indexed search keys.
+
+    A phone-like query matches numbers ending with its digits through the
+    reversed-digits ``phone_field``; anything else matches names starting
+    with it, through the normalized ``name_field`` and the raw
+    ``prefix_fields``. A query neither kind of field can serve matches nothing.
+    """
+    query = query.strip()
+    if PHONE_QUERY.fullmatch(query):
+        if phone_field:
+            return Q(**{f'{phone_field}__startswith': reverse_digits(query)})
+        return Q(pk__in=[])
+
+    condition = Q(pk__in=[])
+    if name_field and normalize_name(query):
+        condition |= Q(**{f'{name_field}__startswith': normalize_name(query)})
+    for field in prefix_fields:
+        condition |= Q(**{f'{field}__startswith': query})
+    return condition
@@ -2,7 +2,8 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.core.validators import RegexValidator
 from drf_spectacular.utils import extend_schema_field
-from .models import UserProfile, Contact, SpamReport
+from .models import AddressBookSummary, UserProfile, Contact, SpamReport
+from .scoring import likelihood, likelihoods
 
 User = get_user_model()
 
@@ -61,6 +62,35 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         )
         return user
 
+class UserImportSerializer(UserRegistrationSerializer):
+    """
+    Registration field checks for bulk imports.
+
+    Uniqueness is checked by the importer for a whole batch at once, so the
+    per-row lookups of the registration serializer are dropped.
+    """
+
+    class Meta(UserRegistrationSerializer.Meta):
+        extra_kwargs = {
+            'password': {'write_only': True},
+            'username': {'required': True, 'validators': [User.username_validator]}
+        }
+
+    def validate_phone_number(self, value):
+        return value
+
+    def validate_username(self, value):
+        return value
+
+class ContactListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        contacts = list(data.all() if hasattr(data, 'all') else data)
+        if 'spam_likelihood' in self.child.fields:
+            # Score the whole page in one batch instead of one query per contact
+            numbers = [contact.phone_number for contact in contacts]
+            self.child.spam_likelihoods = dict(zip(numbers, likelihoods(numbers)))
+        return super().to_representation(contacts)
+
 class ContactSerializer(serializers.ModelSerializer):
     spam_likelihood = serializers.SerializerMethodField()
 
@@ -68,22 +98,49 @@ class ContactSerializer(serializers.ModelSerializer):
         model = Contact
         fields = ['id', 'name', 'phone_number', 'spam_likelihood', 'spam_reported']
         read_only_fields = ['spam_reported']
+        list_serializer_class = ContactListSerializer
+
+    # Model columns each serializer field reads, for QuerySet.only()
+    source_fields = {
+        'id': ['id'],
+        'name': ['name'],
+        'phone_number': ['phone_number'],
+        'spam_likelihood': ['phone_number'],
+        'spam_reported': ['spam_reported'],
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.requested_fields(self.context.get('request'))
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+    @classmethod
+    def requested_fields(cls, request):
+        """Fields named in ``?fields=`` on a read request, or None for all fields."""
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return None
+        names = {name.strip() for name in request.query_params.get('fields', '').split(',')}
+        return (names & set(cls.Meta.fields)) or None
 
     @extend_schema_field(str)
     def get_spam_likelihood(self, obj) -> str:
-        spam_count = SpamReport.objects.filter(phone_number=obj.phone_number).count()
-        if spam_count > 5:
-            return "Very High"
-        elif spam_count > 2:
-            return "High"
-        elif spam_count > 0:
-            return "Medium"
-        return "Low"
+        spam_likelihoods = getattr(self, 'spam_likelihoods', {})
+        if obj.phone_number in spam_likelihoods:
+            return spam_likelihoods[obj.phone_number]
+        return likelihood(obj.phone_number)
 
     def create(self, validated_data):
         validated_data['owner'] = self.context['request'].user
         return super().create(validated_data)
 
+class ContactChangesSerializer(serializers.Serializer):
+    version = serializers.IntegerField()
+    changed = ContactSerializer(many=True)
+    deleted = serializers.ListField(child=serializers.IntegerField())
+    has_more = serializers.BooleanField()
+
 class SpamReportSerializer(serializers.ModelSerializer):
     reporter_username = serializers.CharField(source='reporter.username', read_only=True)
 
@@ -92,9 +149,29 @@ class SpamReportSerializer(serializers.ModelSerializer):
         fields = ['id', 'phone_number', 'timestamp', 'reporter_username']
         read_only_fields = ['timestamp', 'reporter_username']
 
+class SpamFeedEntrySerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    phone_number = serializers.CharField()
+    reporter_id = serializers.IntegerField()
+    timestamp = serializers.DateTimeField()
+
+class SpamFeedSerializer(serializers.Serializer):
+    results = SpamFeedEntrySerializer(many=True)
+    cursor = serializers.CharField()
+    has_more = serializers.BooleanField()
+
+class AddressBookSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AddressBookSummary
+        fields = ['contacts', 'spam_contacts', 'reports_filed']
+
 class SearchResultSerializer(serializers.Serializer):
     name = serializers.CharField()
     phone_number = serializers.CharField()
     spam_likelihood = serializers.CharField()
     is_registered = serializers.BooleanField()
-    contact_count = serializers.IntegerField()
\ No newline at end of file
+    contact_count = serializers.IntegerField()
+
+class SuggestionSerializer(serializers.Serializer):
+    name = serializers.CharField()
+    count = serializers.IntegerField()
@@ -0,0 +1,71 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+class SharedStore:
+    """
+    Small SQLite (WAL mode) file shared by every worker process on a host.
+
+    Used for short-lived coordination state such as throttle counters, so it
+    never touches the main database. Connections are opened lazily per thread
+    and re-opened after a fork, which keeps it safe under gunicorn's
+    pre-fork model.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        self._schema = []
+
+    def register_schema(self, statement):
+        """Register a ``CREATE ... IF NOT EXISTS`` statement run on every new connection."""
+        if statement not in self._schema:
+            self._schema.append(statement)
+            if getattr(self._local, 'conn', None) is not None:
+                self._local.conn.execute(statement)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            for statement in self._schema:
+                conn.execute(statement)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Yield a connection inside a write-locked (BEGIN IMMEDIATE) transaction."""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def execute(self, sql, params=()):
+        return self._connection().execute(sql, params)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_shared_store():
+    path = getattr(settings, 'SHARED_STORE_PATH', None) or os.path.join(
+        settings.BASE_DIR, 'shared_store.sqlite3'
+    )
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = SharedStore(path)
+        return store
@@ -0,0 +1,115 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Contact, NameFrequency, SpamReport, User
+from .ranges import add_range_reports
+from .summary import add_to_summaries
+from .sync import record_deletion
+
+
+def add_saved_name(phone_number, name):
+    updated = NameFrequency.objects.filter(
+        phone_number=phone_number, name=name
+    ).update(count=F('count') + 1)
+    if updated:
+        return
+
+    try:
+        with transaction.atomic():
+            NameFrequency.objects.create(phone_number=phone_number, name=name, count=1)
+    except IntegrityError:
+        # Another request created the row first
+        NameFrequency.objects.filter(
+            phone_number=phone_number, name=name
+        ).update(count=F('count') + 1)
+
+
+def remove_saved_name(phone_number, name):
+    names = NameFrequency.objects.filter(phone_number=phone_number, name=name)
+    names.update(count=F('count') - 1)
+    names.filter(count__lte=0).delete()
+
+
+@receiver(pre_save, sender=Contact)
+def remember_previous_name(sender, instance, raw=False, **kwargs):
+    instance._previous_name = instance._previous_spam_reported = None
+    if instance.pk and not raw:
+        previous = Contact.objects.filter(
+            pk=instance.pk
+        ).values_list('phone_number', 'name', 'spam_reported').first()
+        if previous is not None:
+            instance._previous_name = previous[:2]
+            instance._previous_spam_reported = previous[2]
+
+
+@receiver(post_save, sender=Contact)
+def count_saved_name(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    current = (instance.phone_number, instance.name)
+    previous = getattr(instance, '_previous_name', None)
+    if previous == current:
+        return
+    if previous is not None:
+        remove_saved_name(*previous)
+    add_saved_name(*current)
+
+
+@receiver(post_delete, sender=Contact)
+def uncount_saved_name(sender, instance, **kwargs):
+    remove_saved_name(instance.phone_number, instance.name)
+
+
+def deleted_with_user(origin):
+    return isinstance(origin, User) or getattr(origin, 'model', None) is User
+
+
+@receiver(post_delete, sender=Contact)
+def leave_tombstone(sender, instance, origin=None, **kwargs):
+    # Contacts deleted along with their owner need no tombstone
+    if deleted_with_user(origin):
+        return
+    record_deletion(instance)
+
+
+@receiver(post_save, sender=Contact)
+def count_summary_contact(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        add_to_summaries({instance.owner_id: {'contacts': 1, 'spam_contacts': int(instance.spam_reported)}})
+    elif getattr(instance, '_previous_spam_reported', None) not in (None, instance.spam_reported):
+        add_to_summaries({instance.owner_id: {'spam_contacts': 1 if instance.spam_reported else -1}})
+
+
+@receiver(post_delete, sender=Contact)
+def uncount_summary_contact(sender, instance, origin=None, **kwargs):
+    # The owner's summary goes with the owner
+    if deleted_with_user(origin):
+        return
+    add_to_summaries({instance.owner_id: {'contacts': -1, 'spam_contacts': -int(instance.spam_reported)}})
+
+
+@receiver(post_save, sender=SpamReport)
+def count_range_report(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        add_range_reports([instance.phone_number])
+
+
+@receiver(post_delete, sender=SpamReport)
+def uncount_range_report(sender, instance, **kwargs):
+    add_range_reports([instance.phone_number], delta=-1)
+
+
+@receiver(post_save, sender=SpamReport)
+def count_filed_report(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        add_to_summaries({instance.reporter_id: {'reports_filed': 1}})
+
+
+@receiver(post_delete, sender=SpamReport)
+def uncount_filed_report(sender, instance, origin=None, **kwargs):
+    if not deleted_with_user(origin):
+        add_to_summaries({instance.reporter_id: {'reports_filed': -1}})
@@ -0,0 +1,167 @@
+"""
+Single-flight lookups: identical concurrent computations share one run.
+
+When a number starts calling millions of people, thousands of identical
+phone searches arrive at once. ``flight(key, compute)`` lets only one of
+them reach the database:
+
+* within a process, callers arriving while ``key`` is being computed wait
+  up to ``LOCK_TIMEOUT`` for that run and get its result, then compute it
+  themselves;
+* across the worker processes of a host, the first process takes a lease on
+  ``key`` in the shared store, computes it and publishes the result there.
+  The others poll for the result with plain reads instead of querying, and
+  take over the lease if its holder has not published by ``LOCK_TIMEOUT``.
+
+Only callers that arrived while the lookup ran share its result: by default
+(``RESULT_TTL`` 0) a later caller computes it afresh, so nothing is served
+stale. A positive ``RESULT_TTL`` also serves it for that many seconds.
+
+Results must be JSON-serializable and are shared, so callers must not
+mutate them.
+"""
+import json
+import random
+import threading
+import time
+
+from django.conf import settings
+
+from .sharedstore import get_shared_store
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS single_flight ('
+    ' key TEXT PRIMARY KEY,'
+    ' value TEXT,'  # NULL while the lease holder computes it
+    ' expires REAL NOT NULL'
+    ')'
+)
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Seconds a lease holder has to publish before another process takes over
+    'LOCK_TIMEOUT': 2.0,
+    # Seconds a published result is also served to later identical lookups
+    'RESULT_TTL': 0,
+    'POLL_INTERVAL': 0.01,
+}
+
+# Roughly one publish in this many also purges expired keys.
+PRUNE_EVERY = 1000
+
+
+def get_flight_setting(name):
+    return getattr(settings, 'SINGLE_FLIGHT', {}).get(name, DEFAULTS[name])
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+_calls = {}
+_calls_lock = threading.Lock()
+
+
+def flight(key, compute):
+    """``compute()``, or the result of an identical in-flight run of ``key`` (or one finished within ``RESULT_TTL``)."""
+    if not get_flight_setting('ENABLED'):
+        return compute()
+
+    with _calls_lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+    if not leader:
+        if not call.done.wait(get_flight_setting('LOCK_TIMEOUT')):
+            # The run is stuck; don't queue behind it
+            return compute()
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    try:
+        call.value = _shared_flight(key, compute)
+    except Exception as exc:
+        call.error = exc
+        raise
+    finally:
+        with _calls_lock:
+            del _calls[key]
+        call.done.set()
+    return call.value
+
+
+def _store():
+    store = get_shared_store()
+    store.register_schema(SCHEMA)
+    return store
+
+
+def _read(store, key):
+    return store.execute('SELECT value, expires FROM single_flight WHERE key = ?', (key,)).fetchone()
+
+
+def _usable(row, waited, now):
+    """Whether ``row`` holds a result to return: a fresh one, or any published while we waited."""
+    return row is not None and row[0] is not None and (waited or row[1] > now)
+
+
+def _take_lease(store, key, waited):
+    """Take the lease on ``key`` and return None, or return the row if another process got there first."""
+    now = time.time()
+    with store.transaction() as conn:
+        row = conn.execute('SELECT value, expires FROM single_flight WHERE key = ?', (key,)).fetchone()
+        if row is not None and (row[1] > now or _usable(row, waited, now)):
+            return row
+        conn.execute(
+            'INSERT INTO single_flight (key, value, expires) VALUES (?, NULL, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = NULL, expires = excluded.expires',
+            (key, now + get_flight_setting('LOCK_TIMEOUT'))
+        )
+    return None
+
+
+def _shared_flight(key, compute):
+    store = _store()
+    waited = False
+    while True:
+        # Polled with plain reads; only taking the lease writes
+        row = _read(store, key)
+        if _usable(row, waited, time.time()):
+            return json.loads(row[0])
+        if row is None or row[0] is not None or row[1] <= time.time():
+            row = _take_lease(store, key, waited)
+            if row is None:
+                break
+            if row[0] is not None:
+                return json.loads(row[0])
+        # Another process holds the lease
+        waited = True
+        time.sleep(get_flight_setting('POLL_INTERVAL'))
+
+    try:
+        value = compute()
+    except Exception:
+        # Let the next caller compute it rather than wait out the lease
+        store.execute('DELETE FROM single_flight WHERE key = ? AND value IS NULL', (key,))
+        raise
+    now = time.time()
+    with store.transaction() as conn:
+        conn.execute(
+            'INSERT INTO single_flight (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires',
+            (key, json.dumps(value), now + get_flight_setting('RESULT_TTL'))
+        )
+        if random.randrange(PRUNE_EVERY) == 0:
+            # Results stay readable a while longer for processes still polling
+            conn.execute('DELETE FROM single_flight WHERE expires < ?', (now - get_flight_setting('LOCK_TIMEOUT'),))
+    return value
+
+
+def reset_flights():
+    """Forget all published results and leases (used by tests)."""
+    _store().execute('DELETE FROM single_flight')
@@ -0,0 +1,150 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .instrumentation import explain, fingerprint
+from .models import QueryFingerprint
+
+DEFAULTS = {
+    'ENABLED': False,
+    # Statements at least this slow are counted as slow calls
+    'SLOW_MS': 100,
+    # Statements at least this slow get their plan captured
+    'EXPLAIN_MS': 250,
+    # A fingerprint's plan is re-captured at most this often per process
+    'PLAN_REFRESH_SECONDS': 3600,
+    # Per-process totals are written to the database at most this often
+    'FLUSH_SECONDS': 10,
+}
+
+
+def get_slowlog_setting(name):
+    return getattr(settings, 'SLOW_QUERY_LOG', {}).get(name, DEFAULTS[name])
+
+
+class SlowQueryRecorder:
+    """
+    ``execute_wrapper`` that aggregates calls and time per SQL fingerprint.
+
+    Totals accumulate in process memory and are added to ``QueryFingerprint``
+    rows after a request once ``FLUSH_SECONDS`` have passed, so the flush
+    never runs inside a request's transaction. Statements slower than
+    ``EXPLAIN_MS`` are kept with their parameters and get an ``EXPLAIN`` at
+    flush time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pending = {}
+        self._planned_at = {}
+        self._flushed_at = time.monotonic()
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(self._local, 'busy', False):
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, params, many, (time.perf_counter() - started) * 1000, context['connection'])
+
+    def install(self, sender=None, connection=None, **kwargs):
+        """``connection_created`` receiver that wraps every new connection."""
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def record(self, sql, params, many, ms, connection):
+        # Only bookkeeping here: the caller has not read the statement's
+        # results yet, so running other SQL on the connection now is unsafe
+        key, normalized = fingerprint(sql)
+        with self._lock:
+            entry = self._pending.setdefault(key, {
+                'sql': normalized, 'calls': 0, 'slow_calls': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'plan': None, 'explain': None,
+            })
+            entry['calls'] += 1
+            entry['slow_calls'] += ms >= get_slowlog_setting('SLOW_MS')
+            entry['total_ms'] += ms
+            entry['max_ms'] = max(entry['max_ms'], ms)
+            if ms >= get_slowlog_setting('EXPLAIN_MS') and not many and entry['explain'] is None and self._plan_due(key):
+                entry['explain'] = (sql, params, connection.alias, ms)
+
+    def _plan_due(self, key):
+        now = time.monotonic()
+        if now - self._planned_at.get(key, -float('inf')) < get_slowlog_setting('PLAN_REFRESH_SECONDS'):
+            return False
+        self._planned_at[key] = now
+        return True
+
+    def flush_if_due(self, **kwargs):
+        """``request_finished`` receiver: write totals every ``FLUSH_SECONDS``."""
+        if time.monotonic() - self._flushed_at >= get_slowlog_setting('FLUSH_SECONDS'):
+            self.flush()
+            close_old_connections()
+
+    def flush(self, using='default'):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return
+
+        busy, self._local.busy = getattr(self._local, 'busy', False), True
+        try:
+            for entry in pending.values():
+                if entry['explain'] is not None:
+                    sql, params, alias, entry['plan_ms'] = entry['explain']
+                    try:
+                        entry['plan'] = explain(sql, params, alias)
+                    except DatabaseError:
+                        pass
+            with transaction.atomic(using=using):
+                # Sorted, so concurrent flushes lock rows in the same order
+                for key in sorted(pending):
+                    self._write(key, pending[key], using)
+        except DatabaseError:
+            pass  # the totals are lost, the request is not
+        finally:
+            self._local.busy = busy
+
+    @staticmethod
+    def _write(key, entry, using):
+        changes = {
+            'calls': F('calls') + entry['calls'],
+            'slow_calls': F('slow_calls') + entry['slow_calls'],
+            'total_ms': F('total_ms') + entry['total_ms'],
+            'max_ms': Greatest('max_ms', entry['max_ms']),
+            'last_seen': timezone.now(),
+        }
+        if entry['plan'] is not None:
+            changes.update(plan=entry['plan'], plan_ms=entry['plan_ms'], plan_captured_at=timezone.now())
+
+        rows = QueryFingerprint.objects.using(using).filter(fingerprint=key)
+        if rows.update(**changes):
+            return
+        try:
+            with transaction.atomic(using=using):
+                QueryFingerprint.objects.using(using).create(
+                    fingerprint=key,
+                    sql=entry['sql'],
+                    calls=entry['calls'],
+                    slow_calls=entry['slow_calls'],
+                    total_ms=entry['total_ms'],
+                    max_ms=entry['max_ms'],
+                    plan=entry['plan'] or '',
+                    plan_ms=entry.get('plan_ms'),
+                    plan_captured_at=timezone.now() if entry['plan'] is not None else None,
+                )
+        except IntegrityError:
+            # Another process created the row first
+            rows.update(**changes)
+
+
+recorder = SlowQueryRecorder()
@@ -0,0 +1,220 @@
+import mmap
+import os
+import struct
+import threading
+import time
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import SpamReport
+from .normalization import digits_only
+
+MAGIC = b'SPAMSNP1'
+# magic, row count, max SpamReport id covered, created (unix seconds)
+HEADER = struct.Struct('<8sQQd')
+HEADER_SIZE = 64
+KEY_DTYPE = np.dtype('<u8')
+COUNT_DTYPE = np.dtype('<u4')
+TIME_DTYPE = np.dtype('<i8')
+# Readers re-stat the snapshot file at most this often
+CHECK_INTERVAL = 5
+
+
+def phone_key(phone_number):
+    """
+    Reversible uint64 key for a phone number: its digits, shifted left one bit,
+    with the low bit recording a leading '+'.
+
+    Returns None for numbers that cannot be keyed (non-digit characters or
+    too many digits); those are always scored from the database.
+    """
+    digits = digits_only(phone_number)
+    plus = phone_number.startswith('+')
+    if not digits or len(digits) > 18 or len(digits) + plus != len(phone_number):
+        return None
+    return int(digits) << 1 | plus
+
+
+def key_to_phone(key):
+    key = int(key)
+    return ('+' if key & 1 else '') + str(key >> 1)
+
+
+def get_snapshot_path():
+    return getattr(settings, 'SPAM_SNAPSHOT_PATH', None) or os.path.join(
+        settings.BASE_DIR, 'spam_snapshot.bin'
+    )
+
+
+def write_snapshot(path, chunk_size=100000):
+    """
+    Write a snapshot of report counts per number and return its row count.
+
+    Layout after the 64-byte header, each column 8-byte aligned:
+    sorted uint64 keys, uint32 report counts, int64 last-report times.
+    The file is written beside ``path`` and renamed over it, so readers
+    always see either the old or the new snapshot in full.
+    """
+    max_id = SpamReport.objects.aggregate(m=Max('id'))['m'] or 0
+    reports = SpamReport.objects.filter(id__lte=max_id)
+    rows = (
+        reports.values('phone_number')
+        .annotate(n=Count('id'), last=Max('timestamp'))
+        .order_by()
+        .values_list('phone_number', 'n', 'last')
+        .iterator(chunk_size=chunk_size)
+    )
+
+    # Filled chunk by chunk into arrays sized up front, rather than Python lists
+    capacity = reports.values('phone_number').distinct().count()
+    keys = np.empty(capacity, dtype=KEY_DTYPE)
+    counts = np.empty(capacity, dtype=COUNT_DTYPE)
+    times = np.empty(capacity, dtype=TIME_DTYPE)
+    size = 0
+    while chunk := list(islice(rows, chunk_size)):
+        chunk_keys = [phone_key(row[0]) for row in chunk]
+        keyed = np.fromiter((key is not None for key in chunk_keys), dtype=bool, count=len(chunk))
+        chunk_keys = np.fromiter((key or 0 for key in chunk_keys), dtype=KEY_DTYPE, count=len(chunk))
+        end = size + int(keyed.sum())
+        if end > capacity:
+            # Reports committed after the count with ids below max_id
+            capacity = end
+            keys, counts, times = (np.resize(column, capacity) for column in (keys, counts, times))
+        keys[size:end] = chunk_keys[keyed]
+        counts[size:end] = np.fromiter((row[1] for row in chunk), dtype=COUNT_DTYPE, count=len(chunk))[keyed]
+        times[size:end] = np.fromiter(
+            (row[2].timestamp() for row in chunk), dtype=TIME_DTYPE, count=len(chunk)
+        )[keyed]
+        size = end
+
+    keys = keys[:size]
+    order = np.argsort(keys, kind='stable')
+    columns = (keys[order], counts[:size][order], times[:size][order])
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, size, max_id, time.time()).ljust(HEADER_SIZE, b'\0'))
+        for column in columns:
+            f.write(column.tobytes())
+            f.write(b'\0' * (-f.tell() % 8))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return size
+
+
+class Snapshot:
+    """A memory-mapped snapshot file; columns are zero-copy views of the mapping."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.size, self.max_report_id, self.created = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a spam snapshot')
+
+        offset = HEADER_SIZE
+        columns = []
+        for dtype in (KEY_DTYPE, COUNT_DTYPE, TIME_DTYPE):
+            columns.append(np.frombuffer(self._mmap, dtype=dtype, count=self.size, offset=offset))
+            offset += self.size * dtype.itemsize
+            offset += -offset % 8
+        self.keys, self.counts, self.last_reported = columns
+
+    def lookup(self, keys):
+        """Report counts for ``keys`` (0 where absent), by binary search."""
+        keys = np.asarray(keys, dtype=KEY_DTYPE)
+        if not self.size:
+            return np.zeros(len(keys), dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.keys, keys), self.size - 1)
+        found = self.keys[positions] == keys
+        return np.where(found, self.counts[positions], 0).astype(np.int64)
+
+
+class SnapshotReader:
+    """
+    Per-process handle on the current snapshot.
+
+    Every worker maps the same file, so the data lives once in the OS page
+    cache. The file is re-checked every ``CHECK_INTERVAL`` seconds and a new
+    one (same path, new inode after the writer's rename) is mapped in its
+    place.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0
+
+    def get(self):
+        if not getattr(settings, 'SPAM_SNAPSHOT_ENABLED', False):
+            return None
+        now = time.monotonic()
+        if now - self._checked_at >= CHECK_INTERVAL:
+            with self._lock:
+                self._checked_at = now
+                self._snapshot = self._reload(get_snapshot_path())
+        return self._snapshot
+
+    def _reload(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        current = self._snapshot
+        if current is not None and (current.stat.st_ino, current.stat.st_mtime_ns) == (stat.st_ino, stat.st_mtime_ns):
+            return current
+        return Snapshot(path)
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._checked_at = 0
+
+
+snapshot_reader = SnapshotReader()
+
+
+def snapshot_counts(phone_numbers):
+    """
+    Report counts aligned with ``phone_numbers`` from the snapshot, with reports
+    filed after it overlaid from the database. Returns None without a snapshot.
+
+    Reports deleted since the snapshot was written still count until the
+    next snapshot.
+    """
+    snapshot = snapshot_reader.get()
+    if snapshot is None:
+        return None
+    phone_numbers = list(phone_numbers)
+
+    keys = [phone_key(number) for number in phone_numbers]
+    keyed = [i for i, key in enumerate(keys) if key is not None]
+    counts = np.zeros(len(phone_numbers), dtype=np.int64)
+    counts[keyed] = snapshot.lookup([keys[i] for i in keyed])
+
+    # Reports newer than the snapshot, plus numbers the snapshot cannot key
+    delta = dict(
+        SpamReport.objects.filter(phone_number__in=set(phone_numbers))
+        .filter(id__gt=snapshot.max_report_id)
+        .values('phone_number')
+        .annotate(n=Count('id'))
+        .values_list('phone_number', 'n')
+    )
+    unkeyed = {phone_numbers[i] for i, key in enumerate(keys) if key is None}
+    if unkeyed:
+        delta.update(
+            SpamReport.objects.filter(phone_number__in=unkeyed)
+            .values('phone_number')
+            .annotate(n=Count('id'))
+            .values_list('phone_number', 'n')
+        )
+
+    for i, number in enumerate(phone_numbers):
+        counts[i] += delta.get(number, 0)
+    return counts
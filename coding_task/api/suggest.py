@@ -0,0 +1,246 @@
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import Count, Max, Min
+
+from .models import Contact, User
+from .normalization import normalize_name
+
+DEFAULTS = {
+    'MAX_ENTRIES': 200000,
+    'REFRESH_SECONDS': 30,
+    'REBUILD_SECONDS': 3600,
+    'ARTIFACT_PATH': None,
+}
+# Results for prefixes this short span large ranges, so they are memoized
+SHORT_PREFIX = 2
+
+logger = logging.getLogger(__name__)
+
+
+def get_suggest_setting(name):
+    return getattr(settings, 'NAME_SUGGEST', {}).get(name, DEFAULTS[name])
+
+
+def get_name_index_path():
+    return get_suggest_setting('ARTIFACT_PATH') or os.path.join(settings.BASE_DIR, 'name_index.json')
+
+
+def _contact_counts(after_id, up_to_id):
+    return list(
+        Contact.objects.filter(id__gt=after_id, id__lte=up_to_id)
+        .exclude(name_normalized='')
+        .values('name_normalized')
+        .annotate(display=Min('name'), n=Count('id'))
+        .values_list('name_normalized', 'display', 'n')
+    )
+
+
+def _user_counts(after_id, up_to_id):
+    return list(
+        User.objects.filter(id__gt=after_id, id__lte=up_to_id)
+        .exclude(name_normalized='')
+        .values('name_normalized')
+        .annotate(display=Min('name'), n=Count('id'))
+        .values_list('name_normalized', 'display', 'n')
+    )
+
+
+def _merge_into(entries, rows):
+    for key, name, count in rows:
+        if key in entries:
+            entries[key] = (entries[key][0], entries[key][1] + count)
+        else:
+            entries[key] = (name, count)
+
+
+def count_names(entries=None, after_contact_id=0, after_user_id=0):
+    """
+    ``(entries, last_contact_id, last_user_id)``: ``entries`` (``{key:
+    (name, count)}``) plus the contacts and users after the given ids.
+    """
+    entries = {} if entries is None else entries
+    last_contact_id = Contact.objects.aggregate(m=Max('id'))['m'] or 0
+    last_user_id = User.objects.aggregate(m=Max('id'))['m'] or 0
+    _merge_into(entries, _contact_counts(after_contact_id, last_contact_id))
+    _merge_into(entries, _user_counts(after_user_id, last_user_id))
+    return entries, max(last_contact_id, after_contact_id), max(last_user_id, after_user_id)
+
+
+def most_popular(entries):
+    """``entries`` cut down to the ``MAX_ENTRIES`` most popular names."""
+    max_entries = get_suggest_setting('MAX_ENTRIES')
+    if len(entries) <= max_entries:
+        return entries
+    return dict(heapq.nlargest(max_entries, entries.items(), key=lambda item: item[1][1]))
+
+
+def write_name_index(path):
+    """
+    Write the full index to ``path`` for API workers to load, and return its
+    size. Written beside ``path`` and renamed over it, so workers never read
+    a partial file.
+    """
+    entries, last_contact_id, last_user_id = count_names()
+    entries = most_popular(entries)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({
+            'last_contact_id': last_contact_id,
+            'last_user_id': last_user_id,
+            'names': [[key, name, count] for key, (name, count) in sorted(entries.items())],
+        }, f)
+    os.replace(tmp_path, path)
+    return len(entries)
+
+
+class NameIndex:
+    """
+    In-process prefix index of names ranked by popularity.
+
+    Names are kept as a sorted array of normalized keys, so completions for
+    a prefix are one ``bisect`` plus a top-N selection over the matching
+    range. Popularity is the number of address books (contacts plus
+    registered users) holding the name. At most ``MAX_ENTRIES`` names are
+    kept, preferring the most popular.
+
+    The full index is built once, by ``manage.py build_name_index``, into a
+    file that workers load at start (``warm()``) and reload when it changes.
+    Every ``REFRESH_SECONDS`` a worker merges in the rows created since, by
+    id. Only without that file does each worker build the full index itself,
+    every ``REBUILD_SECONDS``. All of this runs on a background thread and
+    swaps in new arrays, so requests never wait for it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._keys = []
+        self._names = []
+        self._counts = []
+        self._short_cache = {}
+        self._last_contact_id = 0
+        self._last_user_id = 0
+        self._artifact = None
+        self._refreshed_at = None
+        self._built_at = None
+
+    def suggest(self, prefix, limit=10):
+        prefix = normalize_name(prefix)
+        if not prefix:
+            return []
+        self._ensure_fresh()
+
+        with self._lock:
+            cache_key = (prefix, limit)
+            if len(prefix) <= SHORT_PREFIX and cache_key in self._short_cache:
+                return self._short_cache[cache_key]
+
+            lo = bisect_left(self._keys, prefix)
+            hi = bisect_left(self._keys, prefix + '\uffff', lo)
+            top = heapq.nlargest(limit, range(lo, hi), key=self._counts.__getitem__)
+            results = [{'name': self._names[i], 'count': self._counts[i]} for i in top]
+
+            if len(prefix) <= SHORT_PREFIX:
+                self._short_cache[cache_key] = results
+            return results
+
+    def _ensure_fresh(self):
+        if self._refreshed_at is None or \
+                time.monotonic() - self._refreshed_at >= get_suggest_setting('REFRESH_SECONDS'):
+            self._update_in_background()
+
+    def _is_stale(self, now):
+        return self._built_at is None or now - self._built_at >= get_suggest_setting('REBUILD_SECONDS')
+
+    def warm(self):
+        """Load the built index at worker start; the database is not read."""
+        with self._refresh_lock:
+            self._load_if_changed(get_name_index_path())
+
+    def rebuild(self):
+        with self._refresh_lock:
+            self._build()
+
+    def refresh(self):
+        """Merge contacts and users created since the last build or refresh."""
+        if not self._refresh_lock.acquire(blocking=False):
+            return  # another thread is already updating the index
+        try:
+            self._merge_new_rows()
+        finally:
+            self._refresh_lock.release()
+
+    def _update_in_background(self):
+        if not self._refresh_lock.acquire(blocking=False):
+            return  # an update is already running
+
+        def run():
+            try:
+                self._update()
+            except DatabaseError:
+                # Requests keep the current index; the next one retries
+                logger.exception('Name index update failed')
+            finally:
+                self._refresh_lock.release()
+                connection.close()
+
+        threading.Thread(target=run, name='name-index-update', daemon=True).start()
+
+    def _update(self):
+        path = get_name_index_path()
+        self._load_if_changed(path)
+        if self._artifact is None and self._is_stale(time.monotonic()):
+            self._build()
+        else:
+            self._merge_new_rows()
+
+    def _load_if_changed(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._artifact = None
+            return
+        if self._artifact == (stat.st_ino, stat.st_mtime_ns):
+            return
+        with open(path) as f:
+            data = json.load(f)
+        entries = {key: (name, count) for key, name, count in data['names']}
+        self._install(entries, data['last_contact_id'], data['last_user_id'], built=True)
+        self._artifact = (stat.st_ino, stat.st_mtime_ns)
+        # Rows created after the file was written are merged on the next request
+        self._refreshed_at = None
+
+    def _build(self):
+        self._install(*count_names(), built=True)
+
+    def _merge_new_rows(self):
+        with self._lock:
+            entries = {key: (name, count) for key, name, count in zip(self._keys, self._names, self._counts)}
+            after_contact_id, after_user_id = self._last_contact_id, self._last_user_id
+        self._install(*count_names(entries, after_contact_id, after_user_id))
+
+    def _install(self, entries, last_contact_id, last_user_id, built=False):
+        # New names evict the least popular ones once the index is full
+        entries = most_popular(entries)
+        keys = sorted(entries)
+        names = [entries[key][0] for key in keys]
+        counts = [entries[key][1] for key in keys]
+        with self._lock:
+            self._keys, self._names, self._counts = keys, names, counts
+            self._short_cache = {}
+            self._last_contact_id = last_contact_id
+            self._last_user_id = last_user_id
+            self._refreshed_at = time.monotonic()
+            if built:
+                self._built_at = self._refreshed_at
+
+
+name_index = NameIndex()
@@ -0,0 +1,88 @@
+"""
+Per-user address-book summary behind ``GET /api/me/summary/``.
+
+``AddressBookSummary`` holds a user's contact count, spam-flagged contact
+count and reports filed. Writers add their deltas in their own transaction:
+the contact and report signals (signals.py) and ``set_spam_flag``
+(sync.py). A user without a row yet gets one computed from the tables, and
+``manage.py rebuild_address_book_summaries`` recomputes them all.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import AddressBookSummary, Contact, SpamReport
+
+FIELDS = ('contacts', 'spam_contacts', 'reports_filed')
+
+
+def add_to_summaries(changes):
+    """
+    Add ``{owner_id: {field: delta}}`` to the owners' summaries. Call after
+    the change is written, in its transaction: owners without a summary get
+    one computed from the tables, which already count it, so all of a
+    change's fields must be passed in one call.
+    """
+    by_deltas = defaultdict(list)
+    for owner_id, deltas in changes.items():
+        deltas = tuple(sorted((field, delta) for field, delta in deltas.items() if delta))
+        if deltas:
+            by_deltas[deltas].append(owner_id)
+    for deltas, owner_ids in sorted(by_deltas.items()):
+        updated = AddressBookSummary.objects.filter(owner_id__in=owner_ids).update(
+            **{field: F(field) + delta for field, delta in deltas}
+        )
+        if updated < len(owner_ids):
+            existing = set(
+                AddressBookSummary.objects.filter(owner_id__in=owner_ids).values_list('owner_id', flat=True)
+            )
+            missing = [owner_id for owner_id in owner_ids if owner_id not in existing]
+            AddressBookSummary.objects.bulk_create(computed_summaries(missing), ignore_conflicts=True)
+
+
+def computed_summaries(owner_ids):
+    """Unsaved ``AddressBookSummary`` rows for ``owner_ids``, counted from the contacts and reports."""
+    contacts = {
+        row['owner_id']: row for row in
+        Contact.objects.filter(owner_id__in=owner_ids).values('owner_id').annotate(
+            n=Count('id'), spam=Count('id', filter=Q(spam_reported=True))
+        ).order_by()
+    }
+    reports = dict(
+        SpamReport.objects.filter(reporter_id__in=owner_ids).values('reporter_id').annotate(n=Count('id'))
+        .order_by().values_list('reporter_id', 'n')
+    )
+    return [
+        AddressBookSummary(
+            owner_id=owner_id,
+            contacts=contacts.get(owner_id, {}).get('n', 0),
+            spam_contacts=contacts.get(owner_id, {}).get('spam', 0),
+            reports_filed=reports.get(owner_id, 0),
+        )
+        for owner_id in owner_ids
+    ]
+
+
+def get_summary(owner_id):
+    summary = AddressBookSummary.objects.filter(owner_id=owner_id).first()
+    if summary is None:
+        summary, = computed_summaries([owner_id])
+        AddressBookSummary.objects.bulk_create([summary], ignore_conflicts=True)
+    return summary
+
+
+def rebuild_summaries(owner_ids):
+    """
+    Recompute the summaries of ``owner_ids``. The existing rows are locked
+    first, so changes committed meanwhile are either counted or added after.
+    """
+    with transaction.atomic():
+        list(
+            AddressBookSummary.objects.filter(owner_id__in=owner_ids)
+            .select_for_update().order_by('owner_id').values_list('owner_id')
+        )
+        AddressBookSummary.objects.bulk_create(
+            computed_summaries(owner_ids),
+            update_conflicts=True, unique_fields=['owner'], update_fields=FIELDS
+        )
@@ -0,0 +1,132 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import Contact, ContactSyncState, ContactTombstone
+from .summary import add_to_summaries
+
+DEFAULTS = {
+    'PAGE_SIZE': 500,
+    'TOMBSTONE_DAYS': 30,
+}
+
+
+def get_sync_setting(name):
+    return getattr(settings, 'CONTACT_SYNC', {}).get(name, DEFAULTS[name])
+
+
+class ResyncRequired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'This version is too old to sync from; download the full contact list again.'
+    default_code = 'resync_required'
+
+
+def bump_version(owner_id):
+    """
+    Increment and return ``owner_id``'s contact version.
+
+    Call inside the transaction that writes the change: the state row stays
+    locked until it commits, so versions become visible in order.
+    """
+    states = ContactSyncState.objects.filter(owner_id=owner_id)
+    if not states.update(version=F('version') + 1):
+        ContactSyncState.objects.bulk_create([ContactSyncState(owner_id=owner_id)], ignore_conflicts=True)
+        states.update(version=F('version') + 1)
+    return states.values_list('version', flat=True).get()
+
+
+def set_spam_flag(contacts, value):
+    """
+    Set ``spam_reported`` on a queryset of contacts, giving every changed
+    row a new version of its owner. Returns the number of rows changed.
+    """
+    contacts = contacts.exclude(spam_reported=value)
+    with transaction.atomic():
+        owner_ids = list(contacts.order_by().values_list('owner_id', flat=True).distinct())
+        if not owner_ids:
+            return 0
+        ContactSyncState.objects.bulk_create(
+            [ContactSyncState(owner_id=owner_id) for owner_id in owner_ids], ignore_conflicts=True
+        )
+        # Lock in a fixed order so concurrent flag changes cannot deadlock
+        states = ContactSyncState.objects.filter(owner_id__in=owner_ids)
+        list(states.select_for_update().order_by('owner_id').values_list('owner_id'))
+        states.update(version=F('version') + 1)
+        # The owners' locks keep these rows as they are until the update
+        changed = Counter(contacts.filter(owner_id__in=owner_ids).values_list('owner_id', flat=True))
+        updated = contacts.filter(owner_id__in=owner_ids).update(
+            spam_reported=value,
+            version=Subquery(
+                ContactSyncState.objects.filter(owner_id=OuterRef('owner_id')).values('version')
+            )
+        )
+        sign = 1 if value else -1
+        add_to_summaries({owner_id: {'spam_contacts': sign * n} for owner_id, n in changed.items()})
+        return updated
+
+
+def record_deletion(contact):
+    ContactTombstone.objects.create(
+        owner_id=contact.owner_id,
+        contact_id=contact.pk,
+        version=bump_version(contact.owner_id)
+    )
+
+
+def contact_changes(owner, since, limit=None):
+    """
+    Contacts of ``owner`` changed after version ``since``, and ids of those
+    deleted since, as ``{'version', 'changed', 'deleted', 'has_more'}``.
+
+    A page holds whole versions only; ``version`` is where the next call
+    continues. Both sources are read through (owner, version) indexes.
+    """
+    limit = limit or get_sync_setting('PAGE_SIZE')
+    current, pruned = ContactSyncState.objects.filter(owner=owner).values_list(
+        'version', 'pruned_version'
+    ).first() or (0, 0)
+    # since=0 is a full download, which needs no tombstones
+    if since > current or 0 < since < pruned:
+        raise ResyncRequired()
+
+    contacts = Contact.objects.filter(owner=owner, version__gt=since)
+    tombstones = ContactTombstone.objects.filter(owner=owner, version__gt=since)
+    versions = sorted(
+        list(contacts.order_by('version').values_list('version', flat=True)[:limit + 1]) +
+        list(tombstones.order_by('version').values_list('version', flat=True)[:limit + 1])
+    )
+    has_more = len(versions) > limit
+    upto = versions[limit - 1] if has_more else current
+
+    return {
+        'version': upto,
+        'changed': contacts.filter(version__lte=upto).order_by('version', 'id'),
+        'deleted': list(tombstones.filter(version__lte=upto).values_list('contact_id', flat=True)),
+        'has_more': has_more,
+    }
+
+
+def prune_tombstones(days=None):
+    """Delete tombstones older than ``days``, recording per user what was dropped. Returns the count."""
+    days = get_sync_setting('TOMBSTONE_DAYS') if days is None else days
+    expired = ContactTombstone.objects.filter(deleted_at__lt=timezone.now() - timedelta(days=days))
+    # Mark first: if the delete never runs, clients resync needlessly but miss nothing
+    ContactSyncState.objects.filter(owner__in=expired.values('owner_id')).update(
+        pruned_version=Greatest(
+            'pruned_version',
+            Subquery(
+                expired.filter(owner_id=OuterRef('owner_id'))
+                .values('owner_id')
+                .annotate(v=Max('version'))
+                .values('v')
+            )
+        )
+    )
+    return expired.delete()[0]
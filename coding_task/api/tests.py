@@ -1,12 +1,48 @@
-from rest_framework.test import APITestCase
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+import msgpack
+
+from django.core.management import CommandError, call_command
+
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase, APITransactionTestCase
 from django.contrib.auth import get_user_model
-from .models import UserProfile, Contact, SpamReport
+from .models import (
+    AddressBookSummary, UserProfile, Contact, ContactTombstone, CounterShard, NameFrequency, ReporterWeight, RequestProfile, SpamRangeCount,
+    SpamReport
+)
+from .sharedstore import get_shared_store
+from .snapshot import Snapshot, key_to_phone, phone_key, snapshot_reader, write_snapshot
+from .instrumentation import normalize_sql
+from .management.commands.loadtest import Command as LoadTestCommand, Recorder, summarize
+from .slowlog import recorder
+from .ranges import range_keys
+from .reports import compact_counters
+from .reputation import run_batch, weighted_counts
+from .suggest import NameIndex, name_index
+from .singleflight import flight, reset_flights
+from .sync import prune_tombstones, set_spam_flag
+from .scoring import RelativePolicy, likelihoods, population, spam_counts
+from .throttling import UserRateThrottle, reset_throttles
 from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework_simplejwt.tokens import RefreshToken
 
 User = get_user_model()
 
 class SearchTests(APITestCase):
     def setUp(self):
+        reset_throttles()
+        reset_flights()
         # Create test users
         self.user1 = User.objects.create_user(
             username='testuser1',
@@ -96,8 +132,144 @@ class SearchTests(APITestCase):
         # Email should be visible since user2 is in user1's contacts
         self.assertEqual(response.data[0]['email'], 'john@example.com')
 
+    def test_email_hidden_without_contact(self):
+        stranger = User.objects.create_user(username='stranger', password='Test123')
+        UserProfile.objects.create(user=stranger, phone_number='+1999999999')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(stranger).access_token}')
+
+        response = self.client.get(f'/api/search/?q={self.profile1.phone_number}&type=phone')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data[0]['email'])
+
+    def test_phone_suffix_search(self):
+        SpamReport.objects.create(reporter=self.user1, phone_number='+1234567893')
+
+        response = self.client.get('/api/search/?q=4567893&type=phone_suffix')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['phone_number'], '+1234567893')
+        self.assertEqual(response.data[0]['name'], 'Johnson Brown')
+        self.assertEqual(response.data[0]['spam_likelihood'], 'Medium')
+        self.assertNotIn('spam_count', response.data[0])
+        # Same labels as the other searches, range priors included
+        self.assertEqual(
+            [r['spam_likelihood'] for r in response.data], likelihoods([r['phone_number'] for r in response.data])
+        )
+
+        response = self.client.get('/api/search/?q=789&type=phone_suffix')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_fuzzy_name_search(self):
+        Contact.objects.create(owner=self.user2, name='Jhon Carter', phone_number='+1234567894')
+        Contact.objects.create(owner=self.user2, name='Joan Rivers', phone_number='+1234567895')
+
+        response = self.client.get('/api/search/?q=Jon&type=fuzzy')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        names = [r['name'] for r in response.data]
+        self.assertEqual(names[0], 'John Doe')
+        self.assertIn('Jhon Carter', names)
+        self.assertIn('Joan Rivers', names)
+        self.assertNotIn('Johnson Brown', names)
+        self.assertNotIn('distance', response.data[0])
+        self.assertEqual(response.data[0]['spam_likelihood'], 'Low')
+        self.assertTrue(response.data[0]['is_registered'])
+
+    def test_name_suggestions(self):
+        Contact.objects.create(owner=self.user2, name='John Wilson', phone_number='+1234567896')
+        name_index.rebuild()
+
+        response = self.client.get('/api/search/suggest/?q=jo&limit=2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [
+            {'name': 'John Wilson', 'count': 2},
+            {'name': 'John Doe', 'count': 1},
+        ])
+
+        Contact.objects.create(owner=self.user2, name='Joanna Lee', phone_number='+1234567897')
+        name_index.refresh()
+        response = self.client.get('/api/search/suggest/?q=joa')
+        self.assertEqual([r['name'] for r in response.data], ['Joanna Lee'])
+
+    def test_stale_index_rebuilt_in_background(self):
+        name_index.rebuild()
+        before = self.client.get('/api/search/suggest/?q=jo').data
+        started, release = threading.Event(), threading.Event()
+        builders = []
+
+        def slow_build():
+            builders.append(threading.current_thread())
+            started.set()
+            release.wait(5)
+
+        name_index._build = slow_build
+        missing = os.path.join(tempfile.gettempdir(), 'no_name_index.json')
+        try:
+            with self.settings(NAME_SUGGEST={'REBUILD_SECONDS': 0, 'REFRESH_SECONDS': 0, 'ARTIFACT_PATH': missing}):
+                response = self.client.get('/api/search/suggest/?q=jo')
+                self.assertTrue(started.wait(5))
+                # Served from the previous index while the rebuild runs
+                self.assertEqual(response.data, before)
+                self.assertIsNot(builders[0], threading.current_thread())
+                self.client.get('/api/search/suggest/?q=jo')
+                self.assertEqual(len(builders), 1)
+        finally:
+            release.set()
+            builders[0].join(5)
+            del name_index._build
+
+    def test_name_index_loaded_from_artifact(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'name_index.json')
+            with self.settings(NAME_SUGGEST={'ARTIFACT_PATH': path}):
+                call_command('build_name_index', stdout=StringIO())
+                index = NameIndex()
+                with self.assertNumQueries(0):
+                    index.warm()
+                with mock.patch.object(index, '_update_in_background') as update:
+                    self.assertEqual(index.suggest('jo')[0], {'name': 'John Doe', 'count': 1})
+                # Rows created since the file was written are merged off the request
+                update.assert_called_once()
+
+    def test_refresh_evicts_least_popular_names(self):
+        Contact.objects.create(owner=self.user2, name='John Doe', phone_number='+1234567896')
+        with self.settings(NAME_SUGGEST={'MAX_ENTRIES': 2}):
+            index = NameIndex()
+            index.rebuild()
+            Contact.objects.create(owner=self.user2, name='Jill Moss', phone_number='+1234567897')
+            Contact.objects.create(owner=self.user1, name='Jill Moss', phone_number='+1234567898')
+            index.refresh()
+            self.assertEqual(len(index._keys), 2)
+            self.assertCountEqual([r['name'] for r in index.suggest('j')], ['John Doe', 'Jill Moss'])
+
+    def test_phone_search_uses_name_frequencies(self):
+        number = '+1234567899'
+        owners = [self.user1, self.user2] + [
+            User.objects.create_user(username=f'owner{i}', password='Test123') for i in range(3)
+        ]
+        contacts = [
+            Contact.objects.create(owner=owner, name=name, phone_number=number)
+            for owner, name in zip(owners, ['Pizza Place', 'Pizza Place', 'Pizza', 'Pizza', 'Pizza'])
+        ]
+        contacts[2].name = 'Pizza Place'
+        contacts[2].save()
+        contacts[3].delete()
+
+        self.assertEqual(
+            list(NameFrequency.objects.filter(phone_number=number).order_by('name').values_list('name', 'count')),
+            [('Pizza', 1), ('Pizza Place', 3)]
+        )
+
+        response = self.client.get(f'/api/search/?q={number}&type=phone')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(r['name'], r['contact_count']) for r in response.data],
+            [('Pizza Place', 3), ('Pizza', 1)]
+        )
+
 class SpamTests(APITestCase):
     def setUp(self):
+        reset_throttles()
+        reset_flights()
         self.user = User.objects.create_user(
             username='testuser',
             password='Test123',
@@ -141,4 +313,731 @@ class SpamTests(APITestCase):
         
         response = self.client.get('/api/search/?q=' + test_number + '&type=phone')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data[0]['spam_likelihood'], 'Medium') 
\ No newline at end of file
+        self.assertEqual(response.data[0]['spam_likelihood'], 'Medium')
+
+class ThrottleTests(APITestCase):
+    def setUp(self):
+        reset_throttles()
+
+    def make_throttle(self, now):
+        throttle = UserRateThrottle()
+        throttle.rate = '3/minute'
+        throttle.num_requests, throttle.duration = throttle.parse_rate(throttle.rate)
+        throttle.get_cache_key = lambda request, view: 'throttle_test'
+        throttle.timer = lambda: now
+        return throttle
+
+    def test_limit_enforced_within_window(self):
+        allowed = [self.make_throttle(60.0 + i).allow_request(None, None) for i in range(4)]
+        self.assertEqual(allowed, [True, True, True, False])
+
+    def test_previous_window_decays(self):
+        for i in range(3):
+            self.make_throttle(60.0 + i).allow_request(None, None)
+
+        # Halfway through the next window the estimate is 3 * 0.5 = 1.5
+        throttle = self.make_throttle(150.0)
+        self.assertTrue(throttle.allow_request(None, None))
+        throttle = self.make_throttle(150.0)
+        self.assertFalse(throttle.allow_request(None, None))
+        self.assertGreater(throttle.wait(), 0)
+
+    def test_login_limit_kept_between_anonymous_requests(self):
+        statuses = []
+        for _ in range(6):
+            response = self.client.post('/api/auth/login/', {'username': 'nobody', 'password': 'wrong'})
+            statuses.append(response.status_code)
+            self.client.post('/api/auth/register/', {})
+        self.assertEqual(statuses, [status.HTTP_401_UNAUTHORIZED] * 5 + [status.HTTP_429_TOO_MANY_REQUESTS])
+
+class SchemaTests(APITestCase):
+    def test_schema_etag_revalidation(self):
+        response = self.client.get('/schema/', HTTP_ACCEPT='application/vnd.oai.openapi+json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        response = self.client.get(
+            '/schema/',
+            HTTP_ACCEPT='application/vnd.oai.openapi+json',
+            HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_schema_access_follows_spectacular_settings(self):
+        from .schema import CachedSchemaView
+
+        with mock.patch.object(CachedSchemaView, 'permission_classes', [IsAdminUser]):
+            response = self.client.get('/schema/', HTTP_ACCEPT='application/vnd.oai.openapi+json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # Not served from the public artifact or memoized schema
+        with mock.patch.object(CachedSchemaView, 'serve_public', False):
+            response = self.client.get('/schema/', HTTP_ACCEPT='application/vnd.oai.openapi+json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', response)
+
+class ScoringTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='scorer', password='Test123')
+        UserProfile.objects.create(user=self.user, phone_number='+1234567890')
+        for i in range(3):
+            reporter = User.objects.create_user(username=f'reporter{i}', password='Test123')
+            SpamReport.objects.create(reporter=reporter, phone_number='+1111111111')
+        population.invalidate()
+
+    def test_batch_likelihoods(self):
+        self.assertEqual(
+            likelihoods(['+1111111111', '+2222222222', '+1111111111']),
+            ['High', 'Low', 'High']
+        )
+
+    def test_relative_policy(self):
+        # 3 reports against a single registered user is 300%
+        self.assertEqual(RelativePolicy().labels([0, 3]).tolist(), ['Low', 'Very High'])
+
+    def test_contact_list_scored_in_one_query(self):
+        for i in range(5):
+            Contact.objects.create(owner=self.user, name=f'Contact {i}', phone_number=f'+111111111{i}')
+        self.client.force_authenticate(self.user)
+        reset_throttles()
+
+        # Page, count, then one grouped report count and one range read for the scores
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/contacts/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        scores = {r['phone_number']: r['spam_likelihood'] for r in response.data['results']}
+        self.assertEqual(scores['+1111111111'], 'High')
+        self.assertEqual(scores['+1111111112'], 'Low')
+
+    def test_snapshot_with_delta_overlay(self):
+        path = os.path.join(tempfile.mkdtemp(), 'spam_snapshot.bin')
+        self.assertEqual(write_snapshot(path), 1)
+
+        reporter = User.objects.create_user(username='late_reporter', password='Test123')
+        SpamReport.objects.create(reporter=reporter, phone_number='+1111111111')
+        SpamReport.objects.create(reporter=reporter, phone_number='1-800-SPAM')
+
+        with override_settings(SPAM_SNAPSHOT_ENABLED=True, SPAM_SNAPSHOT_PATH=path):
+            snapshot_reader.invalidate()
+            counts = spam_counts(['+1111111111', '+2222222222', '1-800-SPAM'])
+            self.assertEqual(counts.tolist(), [4, 0, 1])
+        snapshot_reader.invalidate()
+
+    def test_snapshot_written_in_chunks(self):
+        reporter = User.objects.create_user(username='bulk_reporter', password='Test123')
+        for number in ['+3333333333', '1-800-SPAM', '+2222222222', '4444444444']:
+            SpamReport.objects.create(reporter=reporter, phone_number=number)
+        path = os.path.join(tempfile.mkdtemp(), 'spam_snapshot.bin')
+        self.assertEqual(write_snapshot(path, chunk_size=2), 4)
+
+        snapshot = Snapshot(path)
+        self.assertEqual(
+            [key_to_phone(key) for key in snapshot.keys],
+            ['+1111111111', '+2222222222', '+3333333333', '4444444444']
+        )
+        self.assertEqual(snapshot.counts.tolist(), [3, 1, 1, 1])
+
+    def test_phone_key_round_trip(self):
+        for number in ['+1234567890', '1234567890', '+919876543210']:
+            self.assertEqual(key_to_phone(phone_key(number)), number)
+        self.assertIsNone(phone_key('1-800-SPAM'))
+
+class ContactListTests(APITestCase):
+    def setUp(self):
+        reset_throttles()
+        self.user = User.objects.create_user(username='owner', password='Test123')
+        UserProfile.objects.create(user=self.user, phone_number='+1234567890')
+        Contact.objects.create(owner=self.user, name='bob', phone_number='+1000000001', spam_reported=True)
+        Contact.objects.create(owner=self.user, name='Alice', phone_number='+2000000002')
+        Contact.objects.create(owner=self.user, name='Alan', phone_number='+1000000003')
+        self.client.force_authenticate(self.user)
+
+    def names(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [c['name'] for c in response.data['results']]
+
+    def test_filters_and_ordering(self):
+        self.assertEqual(self.names('/api/contacts/?ordering=name'), ['Alan', 'Alice', 'bob'])
+        self.assertEqual(self.names('/api/contacts/?ordering=-name'), ['bob', 'Alice', 'Alan'])
+        self.assertEqual(self.names('/api/contacts/?name=al&ordering=name'), ['Alan', 'Alice'])
+        self.assertEqual(self.names('/api/contacts/?spam_reported=true'), ['bob'])
+        self.assertEqual(self.names('/api/contacts/?phone=%2B1&ordering=phone_number'), ['bob', 'Alan'])
+
+        response = self.client.get('/api/contacts/?ordering=owner')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sparse_fieldset_skips_scoring(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/contacts/?fields=id,name')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name'})
+
+
+class ImportUsersTests(APITestCase):
+    def test_import_with_duplicates_and_resume(self):
+        User.objects.create_user(username='taken', password='Test123')
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'users.csv')
+            with open(path, 'w') as f:
+                f.write('username,password,phone_number,name,email\n')
+                f.write('alice,Secret123,+1000000001,Alice Smith,alice@example.com\n')
+                f.write('taken,Secret123,+1000000002,Taken,\n')
+                f.write('bob,Secret123,+1000000001,Bob,\n')
+                f.write('carol,short,+1000000003,Carol,\n')
+                f.write('dave,Secret123,+1000000004,Dave,\n')
+
+            call_command('import_users', path, batch_size=2, workers=2, stdout=StringIO())
+
+            alice = User.objects.get(username='alice')
+            self.assertTrue(alice.check_password('Secret123'))
+            self.assertEqual(alice.name_normalized, 'alice smith')
+            self.assertEqual(alice.profile.email, 'alice@example.com')
+            self.assertEqual(alice.profile.phone_reversed, '1000000001')
+            self.assertTrue(User.objects.filter(username='dave').exists())
+            self.assertFalse(User.objects.filter(username__in=['bob', 'carol']).exists())
+
+            with open(path, 'a') as f:
+                f.write('erin,Secret123,+1000000005,Erin,\n')
+            call_command('import_users', path, resume=True, workers=0, stdout=StringIO())
+            self.assertTrue(User.objects.filter(username='erin').exists())
+            self.assertEqual(UserProfile.objects.count(), 3)
+
+
+class AdminTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='Admin123', name='Admin')
+        owners = [User.objects.create_user(username=f'owner{i}', password='Test123') for i in range(3)]
+        for i, owner in enumerate(owners):
+            UserProfile.objects.create(user=owner, phone_number=f'+100000000{i}')
+            Contact.objects.create(owner=owner, name=f'John {i}', phone_number=f'+200000000{i}')
+            SpamReport.objects.create(reporter=owner, phone_number=f'+200000000{i}')
+        self.client.force_login(self.admin)
+
+    def test_changelists_avoid_per_row_queries(self):
+        # session, user, count, page (plus the group filter's choices for users)
+        for url, queries in (('/admin/api/contact/', 4), ('/admin/api/spamreport/', 4), ('/admin/api/user/', 5)):
+            with self.assertNumQueries(queries):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_indexed_search(self):
+        response = self.client.get('/admin/api/contact/', {'q': 'jOHN'})
+        self.assertEqual(len(response.context['cl'].result_list), 3)
+        response = self.client.get('/admin/api/contact/', {'q': '0002'})
+        self.assertEqual([c.name for c in response.context['cl'].result_list], ['John 2'])
+        response = self.client.get('/admin/api/user/', {'q': '+1000000001'})
+        self.assertEqual([u.username for u in response.context['cl'].result_list], ['owner1'])
+        response = self.client.get('/admin/api/user/', {'q': 'owner'})
+        self.assertEqual(len(response.context['cl'].result_list), 3)
+
+
+@override_settings(SPAM_FEED={'SETTLE_SECONDS': 0, 'POLL_INTERVAL': 0.05})
+class SpamFeedTests(APITestCase):
+    def setUp(self):
+        reset_throttles()
+        self.staff = User.objects.create_user(username='staff', password='Test123', is_staff=True)
+        self.reporter = User.objects.create_user(username='reporter', password='Test123')
+        for i in range(3):
+            SpamReport.objects.create(reporter=self.reporter, phone_number=f'+100000000{i}')
+        self.client.force_authenticate(self.staff)
+
+    def test_feed_pages_with_cursor(self):
+        with self.settings(SPAM_FEED={'SETTLE_SECONDS': 0, 'PAGE_SIZE': 2}):
+            first = self.client.get('/api/spam-reports/feed/').data
+            self.assertEqual([r['phone_number'] for r in first['results']], ['+1000000000', '+1000000001'])
+            self.assertTrue(first['has_more'])
+
+            second = self.client.get('/api/spam-reports/feed/', {'since': first['cursor']}).data
+            self.assertEqual([r['phone_number'] for r in second['results']], ['+1000000002'])
+            self.assertFalse(second['has_more'])
+
+        empty = self.client.get('/api/spam-reports/feed/', {'since': second['cursor'], 'wait': 0.2}).data
+        self.assertEqual(empty['results'], [])
+        self.assertEqual(empty['cursor'], second['cursor'])
+
+        SpamReport.objects.create(reporter=self.staff, phone_number='+1000000009')
+        latest = self.client.get('/api/spam-reports/feed/', {'since': second['cursor']}).data
+        self.assertEqual([r['reporter_id'] for r in latest['results']], [self.staff.id])
+
+    @override_settings(SPAM_FEED={'SETTLE_SECONDS': 2})
+    def test_feed_stops_before_unsettled_report(self):
+        reports = list(SpamReport.objects.order_by('id'))
+        SpamReport.objects.update(timestamp=timezone.now() - timedelta(minutes=1))
+        # The middle report's transaction committed last
+        SpamReport.objects.filter(id=reports[1].id).update(timestamp=timezone.now())
+
+        first = self.client.get('/api/spam-reports/feed/').data
+        self.assertEqual([r['id'] for r in first['results']], [reports[0].id])
+
+        SpamReport.objects.filter(id=reports[1].id).update(timestamp=timezone.now() - timedelta(minutes=1))
+        second = self.client.get('/api/spam-reports/feed/', {'since': first['cursor']}).data
+        self.assertEqual([r['id'] for r in second['results']], [reports[1].id, reports[2].id])
+
+    def test_feed_requires_staff_and_valid_cursor(self):
+        self.assertEqual(
+            self.client.get('/api/spam-reports/feed/', {'since': 'garbage!'}).status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+        self.client.force_authenticate(self.reporter)
+        self.assertEqual(self.client.get('/api/spam-reports/feed/').status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ContactSyncTests(APITestCase):
+    def setUp(self):
+        reset_throttles()
+        self.user = User.objects.create_user(username='owner', password='Test123')
+        self.other = User.objects.create_user(username='other', password='Test123')
+        self.alice = Contact.objects.create(owner=self.user, name='Alice', phone_number='+1000000001')
+        self.bob = Contact.objects.create(owner=self.user, name='Bob', phone_number='+1000000002')
+        self.client.force_authenticate(self.user)
+
+    def changes(self, since):
+        response = self.client.get('/api/contacts/changes/', {'since': since})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_delta_sync(self):
+        initial = self.changes(0)
+        self.assertEqual([c['name'] for c in initial['changed']], ['Alice', 'Bob'])
+        self.assertEqual(self.changes(initial['version'])['changed'], [])
+
+        # Another user's report flips the flag on this user's contact
+        self.client.force_authenticate(self.other)
+        self.client.post('/api/spam-reports/', {'phone_number': '+1000000002'})
+        self.client.force_authenticate(self.user)
+        alice_id = self.alice.id
+        self.alice.delete()
+
+        delta = self.changes(initial['version'])
+        self.assertEqual([(c['name'], c['spam_reported']) for c in delta['changed']], [('Bob', True)])
+        self.assertEqual(delta['deleted'], [alice_id])
+        self.assertEqual(self.changes(delta['version'])['deleted'], [])
+
+    def test_resync_required_after_pruning(self):
+        version = self.changes(0)['version']
+        self.bob.delete()
+        ContactTombstone.objects.update(deleted_at='2000-01-01T00:00:00Z')
+        self.assertEqual(prune_tombstones(days=30), 1)
+
+        response = self.client.get('/api/contacts/changes/', {'since': version})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertEqual([c['name'] for c in self.changes(0)['changed']], ['Alice'])
+
+    def test_deleting_owner_leaves_no_tombstones(self):
+        self.user.delete()
+        self.assertFalse(ContactTombstone.objects.exists())
+
+
+class ProfilingTests(APITestCase):
+    def setUp(self):
+        reset_throttles()
+        self.staff = User.objects.create_user(username='staff', password='Test123', is_staff=True)
+        self.user = User.objects.create_user(username='user', password='Test123')
+        Contact.objects.create(owner=self.staff, name='John', phone_number='+1000000001')
+
+    def get(self, user, **params):
+        token = RefreshToken.for_user(user).access_token
+        return self.client.get('/api/contacts/', params, HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_staff_profile_captured(self):
+        self.assertNotIn('X-Profile-Id', self.get(self.staff))
+
+        with self.settings(PROFILING={'EXPLAIN_SLOWEST': 10}):
+            response = self.get(self.staff, _profile='explain')
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual(profile.status_code, 200)
+        self.assertEqual(profile.sql_count, len(profile.queries))
+        self.assertTrue(any('api_contact' in query['sql'] and query['plan'] for query in profile.queries))
+        self.assertIn('cumulative', profile.call_stats)
+
+        self.staff.is_superuser = True
+        self.staff.save()
+        self.client.force_login(self.staff)
+        page = self.client.get(f'/admin/api/requestprofile/{profile.pk}/change/')
+        self.assertContains(page, 'api_contact')
+
+    def test_ignored_for_non_staff(self):
+        self.assertNotIn('X-Profile-Id', self.get(self.user, _profile='1'))
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_ring_buffer_is_bounded(self):
+        with self.settings(PROFILING={'KEEP': 2, 'EXPLAIN_SAMPLE_RATE': 0}):
+            for _ in range(4):
+                self.get(self.staff, _profile='1')
+        self.assertEqual(RequestProfile.objects.count(), 2)
+
+
+@override_settings(SLOW_QUERY_LOG={'SLOW_MS': 0, 'EXPLAIN_MS': 0, 'FLUSH_SECONDS': 3600})
+class SlowQueryLogTests(APITestCase):
+    def test_fingerprints_and_report(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE a IN (%s, %s) AND b = 'x' LIMIT 21"),
+            normalize_sql("SELECT * FROM t WHERE a IN (%s) AND b = 'y''z' LIMIT 5"),
+        )
+
+        owner = User.objects.create_user(username='owner', password='Test123')
+        with connection.execute_wrapper(recorder):
+            for number in ('+1000000001', '+1000000002'):
+                list(Contact.objects.filter(phone_number=number))
+            list(Contact.objects.filter(owner=owner, name='x'))
+            list(Contact.objects.filter(spam_reported=True, name__contains='x'))
+
+        out = StringIO()
+        call_command('query_report', plans=True, stdout=out)
+        report = out.getvalue()
+        # The two phone lookups share a fingerprint
+        self.assertIn('        2       2', report)
+        self.assertEqual(report.count('sequential scan on api_contact'), 1)
+
+
+class IndexPlanTests(APITestCase):
+    def test_hot_queries_use_indexes(self):
+        user = User.objects.create_user(username='owner', password='Test123')
+        Contact.objects.create(owner=user, name='John', phone_number='+1000000001')
+        SpamReport.objects.create(reporter=user, phone_number='+1000000001')
+        out = StringIO()
+        call_command('check_index_plans', stdout=out)
+        self.assertIn('ok   spam count by number (index-only)', out.getvalue())
+        self.assertNotIn('FAIL', out.getvalue())
+
+
+class ReconcileSpamTests(APITransactionTestCase):
+    def test_reconcile_counters(self):
+        owner = User.objects.create_user(username='owner', password='Test123')
+        reporters = [User.objects.create_user(username=f'reporter{i}', password='Test123') for i in range(2)]
+        profile = UserProfile.objects.create(user=owner, phone_number='+1000000001', spam_count=7)
+        flagged = Contact.objects.create(owner=reporters[0], name='Flagged', phone_number='+1000000002', spam_reported=True)
+        missed = Contact.objects.create(owner=reporters[1], name='Missed', phone_number='+1000000001')
+        for reporter in reporters:
+            SpamReport.objects.create(reporter=reporter, phone_number='+1000000001')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            options = {'chunk_size': 1, 'workers': 1, 'pause': 0, 'checkpoint': os.path.join(tmp, 'progress'),
+                       'stdout': StringIO()}
+            call_command('reconcile_spam', dry_run=True, **options)
+            profile.refresh_from_db()
+            self.assertEqual(profile.spam_count, 7)
+
+            call_command('reconcile_spam', **options)
+            with open(options['checkpoint']) as f:
+                self.assertEqual(json.load(f), {'profiles': profile.id, 'contacts': missed.id})
+
+        profile.refresh_from_db()
+        flagged.refresh_from_db()
+        missed.refresh_from_db()
+        self.assertEqual(profile.spam_count, 2)
+        self.assertFalse(flagged.spam_reported)
+        self.assertTrue(missed.spam_reported)
+        self.assertGreater(missed.version, 1)
+
+
+class ReputationTests(APITestCase):
+    def test_weights_follow_agreement(self):
+        honest = [User.objects.create_user(username=f'honest{i}', password='Test123') for i in range(3)]
+        noisy = User.objects.create_user(username='noisy', password='Test123')
+        for user in honest:
+            SpamReport.objects.create(reporter=user, phone_number='+1000000001')
+        for i in range(6):
+            SpamReport.objects.create(reporter=noisy, phone_number=f'+20000000{i:02}')
+
+        run_batch(chunk_size=4)
+        weights = dict(ReporterWeight.objects.values_list('reporter__username', 'weight'))
+        self.assertGreater(weights['honest0'], 0.9)
+        self.assertLess(weights['noisy'], 0.3)
+
+        # A report filed after the run counts with its reporter's weight
+        SpamReport.objects.create(reporter=noisy, phone_number='+1000000001')
+        counts = weighted_counts(['+1000000001', '+2000000000', '+3000000000'])
+        self.assertAlmostEqual(counts[0], 3 * weights['honest0'] + weights['noisy'])
+        self.assertAlmostEqual(counts[1], weights['noisy'])
+        self.assertEqual(counts[2], 0)
+
+        with self.settings(SPAM_SCORING={'WEIGHTED': True}):
+            self.assertEqual(likelihoods(['+1000000001', '+2000000000']), ['High', 'Medium'])
+
+
+class SpamRangeTests(APITestCase):
+    def test_unreported_number_inherits_range(self):
+        self.assertEqual(
+            [key for key, _ in range_keys('+91 98765 43210')], ['919876543***', '91987654****', '919876******']
+        )
+
+        reporter = User.objects.create_user(username='reporter', password='Test123')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(reporter).access_token}')
+        for i in range(12):
+            response = self.client.post('/api/spam-reports/', {'phone_number': f'+155501230{i:02}'})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # A fresh number in the range, and one in another range, before and
+        # after the counter shards are compacted
+        self.assertEqual(likelihoods(['+15550123099', '+15550999099']), ['High', 'Low'])
+        compact_counters()
+        self.assertEqual(SpamRangeCount.objects.get(prefix='15550123***').reports, 12)
+        self.assertEqual(likelihoods(['+15550123099', '+15550999099']), ['High', 'Low'])
+        response = self.client.get('/api/search/', {'q': '+15550123099', 'type': 'phone'})
+        self.assertEqual(response.data[0]['spam_likelihood'], 'High')
+        with self.settings(SPAM_SCORING={'RANGE_PRIOR': False}):
+            self.assertEqual(likelihoods(['+15550123099']), ['Low'])
+
+        SpamReport.objects.filter(phone_number__lt='+15550123008').delete()
+        self.assertEqual(likelihoods(['+15550123099']), ['Low'])
+        compact_counters()
+        self.assertEqual(SpamRangeCount.objects.get(prefix='15550123***').reports, 4)
+
+
+
+class ShardedCounterTests(APITestCase):
+    @override_settings(SPAM_COUNTERS={'SHARDS': 4})
+    def test_hot_number_reports_spread_over_shards(self):
+        owner = User.objects.create_user(username='owner', password='Test123')
+        profile = UserProfile.objects.create(user=owner, phone_number='+1000000001')
+        for i in range(20):
+            reporter = User.objects.create_user(username=f'reporter{i}', password='Test123')
+            self.client.force_authenticate(reporter)
+            response = self.client.post('/api/spam-reports/', {'phone_number': '+1000000001'})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.post('/api/spam-reports/', {'phone_number': '+1000000001'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        shards = CounterShard.objects.filter(key='n:+1000000001')
+        self.assertGreater(shards.count(), 1)
+        self.assertLessEqual(shards.count(), 4)
+        self.assertEqual(sum(shards.values_list('value', flat=True)), 20)
+
+        compact_counters()
+        profile.refresh_from_db()
+        self.assertEqual(profile.spam_count, 20)
+        self.assertFalse(shards.exclude(value=0).exists())
+        # Shards left at zero are dropped by the next compaction
+        compact_counters()
+        self.assertFalse(CounterShard.objects.exists())
+
+
+class CompactFormatTests(APITestCase):
+    def setUp(self):
+        reset_throttles()
+        self.user = User.objects.create_user(username='mobile', password='Test123', name='Mobile')
+        UserProfile.objects.create(user=self.user, phone_number='+1000000001')
+        for i in range(3):
+            Contact.objects.create(owner=self.user, name=f'Contact {i}', phone_number=f'+200000000{i}')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_msgpack_round_trip(self):
+        response = self.client.post(
+            '/api/spam-reports/', msgpack.packb({'phone_number': '+2000000000'}),
+            content_type='application/msgpack', HTTP_ACCEPT='application/msgpack'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content)['phone_number'], '+2000000000')
+
+        response = self.client.get('/api/contacts/?shape=columns&fields=name,phone_number', HTTP_ACCEPT='application/msgpack')
+        results = msgpack.unpackb(response.content)['results']
+        self.assertEqual(results['name'], ['Contact 0', 'Contact 1', 'Contact 2'])
+        self.assertEqual(results['phone_number'], ['+2000000000', '+2000000001', '+2000000002'])
+
+        # JSON stays the default
+        response = self.client.get('/api/search/', {'q': 'Contact', 'type': 'name', 'shape': 'columns'})
+        self.assertEqual(response.json()['name'], ['Contact 0', 'Contact 1', 'Contact 2'])
+
+    def test_bench_renderers(self):
+        out = StringIO()
+        call_command('bench_renderers', repeat=1, stdout=out)
+        self.assertIn('msgpack', out.getvalue())
+
+
+class IngestSpamFeedTests(APITestCase):
+    def test_ingest_with_duplicates_and_resume(self):
+        owner = User.objects.create_user(username='owner', password='Test123')
+        profile = UserProfile.objects.create(user=owner, phone_number='+919876543210')
+        contact = Contact.objects.create(owner=owner, name='Caller', phone_number='+919876543211')
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'feed.csv')
+            with open(path, 'w') as f:
+                f.write('reported_at,msisdn\n')
+                f.write('2026-01-01,+91 98765-43210\n')
+                f.write('2026-01-01,0091 9876543211\n')
+                f.write('2026-01-02,+919876543210\n')
+                f.write('2026-01-02,not a number\n')
+
+            call_command('ingest_spam_feed', path, column='msisdn', chunk_size=2, stdout=StringIO())
+
+            reporter = User.objects.get(username='carrier-feed')
+            self.assertFalse(reporter.has_usable_password())
+            self.assertEqual(
+                sorted(SpamReport.objects.filter(reporter=reporter).values_list('phone_number', 'phone_reversed')),
+                [('+919876543210', '012345678919'), ('+919876543211', '112345678919')]
+            )
+            profile.refresh_from_db()
+            contact.refresh_from_db()
+            self.assertEqual(profile.spam_count, 1)
+            self.assertTrue(contact.spam_reported)
+            self.assertEqual(SpamRangeCount.objects.get(prefix='919876543***').reports, 2)
+
+            with open(path, 'a') as f:
+                f.write('2026-01-03,+919876543212\n')
+            out = StringIO()
+            call_command('ingest_spam_feed', path, column='msisdn', resume=True, stdout=out)
+            self.assertIn('Ingested 1 new reports', out.getvalue())
+            # Re-running from the start adds nothing
+            call_command('ingest_spam_feed', path, column='msisdn', stdout=out)
+            self.assertIn('Ingested 0 new reports; 4 already reported, 1 invalid', out.getvalue())
+            self.assertEqual(SpamReport.objects.count(), 3)
+            profile.refresh_from_db()
+            self.assertEqual(profile.spam_count, 1)
+            self.assertEqual(SpamRangeCount.objects.get(prefix='919876543***').reports, 3)
+
+
+class SingleFlightTests(APITestCase):
+    def setUp(self):
+        reset_flights()
+
+    def test_concurrent_callers_share_one_run(self):
+        started, release = threading.Event(), threading.Event()
+        runs = []
+
+        def compute():
+            runs.append(1)
+            started.set()
+            release.wait(5)
+            return {'count': len(runs)}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight('key', compute))) for _ in range(8)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(results, [{'count': 1}] * 8)
+        # A later call is not served the finished run's result
+        self.assertEqual(flight('key', compute), {'count': 2})
+
+        with self.settings(SINGLE_FLIGHT={'RESULT_TTL': 5}):
+            self.assertEqual(flight('cached', compute), {'count': 3})
+            self.assertEqual(flight('cached', compute), {'count': 3})
+
+    def test_stalled_run_is_not_waited_on_past_lock_timeout(self):
+        started, release = threading.Event(), threading.Event()
+
+        def stalled():
+            started.set()
+            release.wait(5)
+            return 'stalled'
+
+        leader = threading.Thread(target=flight, args=('key', stalled))
+        leader.start()
+        try:
+            started.wait(5)
+            with self.settings(SINGLE_FLIGHT={'LOCK_TIMEOUT': 0.05}):
+                self.assertEqual(flight('key', lambda: 'local'), 'local')
+        finally:
+            release.set()
+            leader.join(5)
+
+    def test_waits_for_lease_held_by_another_process(self):
+        store = get_shared_store()
+        store.execute('INSERT INTO single_flight (key, value, expires) VALUES (?, NULL, ?)', ('key', time.time() + 5))
+        threading.Timer(
+            0.05, lambda: store.execute('UPDATE single_flight SET value = ? WHERE key = ?', ('[1, 2]', 'key'))
+        ).start()
+        self.assertEqual(flight('key', lambda: self.fail('computed while the lease was held')), [1, 2])
+
+        # An expired lease is taken over
+        store.execute('UPDATE single_flight SET value = NULL, expires = ? WHERE key = ?', (time.time() - 1, 'key'))
+        self.assertEqual(flight('key', lambda: [3]), [3])
+
+    def test_phone_search_not_served_stale(self):
+        user = User.objects.create_user(username='searcher', password='Test123')
+        UserProfile.objects.create(user=user, phone_number='+1000000001')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        Contact.objects.create(owner=user, name='Caller', phone_number='+2000000001')
+
+        self.client.get('/api/search/', {'q': '+2000000001', 'type': 'phone'})
+        other = User.objects.create_user(username='other', password='Test123')
+        Contact.objects.create(owner=other, name='Caller', phone_number='+2000000001')
+        response = self.client.get('/api/search/', {'q': '+2000000001', 'type': 'phone'})
+        self.assertEqual(response.data[0]['contact_count'], 2)
+
+
+class AddressBookSummaryTests(APITestCase):
+    def setUp(self):
+        reset_throttles()
+        self.user = User.objects.create_user(username='owner', password='Test123')
+        UserProfile.objects.create(user=self.user, phone_number='+1000000001')
+        self.reporter = User.objects.create_user(username='reporter', password='Test123')
+
+    def summary(self):
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/me/summary/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_counters_follow_contacts_flags_and_reports(self):
+        # Contacts saved before the user had a summary are counted from the table
+        Contact.objects.create(owner=self.user, name='Old', phone_number='+2000000000')
+        self.client.force_authenticate(self.user)
+        for i in range(1, 4):
+            response = self.client.post('/api/contacts/', {'name': f'Contact {i}', 'phone_number': f'+200000000{i}'})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.client.post('/api/spam-reports/', {'phone_number': '+3000000000'})
+
+        self.client.force_authenticate(self.reporter)
+        self.client.post('/api/spam-reports/', {'phone_number': '+2000000001'})
+        self.client.post('/api/spam-reports/', {'phone_number': '+2000000002'})
+        self.assertEqual(self.summary(), {'contacts': 4, 'spam_contacts': 2, 'reports_filed': 1})
+
+        Contact.objects.get(phone_number='+2000000001').delete()
+        SpamReport.objects.filter(phone_number='+3000000000').delete()
+        self.assertEqual(self.summary(), {'contacts': 3, 'spam_contacts': 1, 'reports_filed': 0})
+
+        set_spam_flag(Contact.objects.filter(owner=self.user), False)
+        self.assertEqual(self.summary(), {'contacts': 3, 'spam_contacts': 0, 'reports_filed': 0})
+        self.assertEqual(AddressBookSummary.objects.get(owner=self.reporter).reports_filed, 2)
+
+    def test_flagged_contact_of_user_without_summary(self):
+        contact = Contact.objects.create(owner=self.user, name='Caller', phone_number='+2000000001', spam_reported=True)
+        self.assertEqual(self.summary(), {'contacts': 1, 'spam_contacts': 1, 'reports_filed': 0})
+
+        AddressBookSummary.objects.filter(owner=self.user).delete()
+        self.client.force_authenticate(self.user)
+        response = self.client.delete(f'/api/contacts/{contact.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.summary(), {'contacts': 0, 'spam_contacts': 0, 'reports_filed': 0})
+
+    def test_rebuild(self):
+        Contact.objects.create(owner=self.user, name='Caller', phone_number='+2000000001', spam_reported=True)
+        SpamReport.objects.create(reporter=self.user, phone_number='+2000000001')
+        AddressBookSummary.objects.filter(owner=self.user).update(contacts=9, spam_contacts=9, reports_filed=9)
+
+        call_command('rebuild_address_book_summaries', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.summary(), {'contacts': 1, 'spam_contacts': 1, 'reports_filed': 1})
+        self.assertEqual(AddressBookSummary.objects.get(owner=self.reporter).contacts, 0)
+
+
+class LoadTestTests(APITestCase):
+    def test_parse_mix(self):
+        command = LoadTestCommand()
+        self.assertEqual(command.parse_mix('phone=3,report=0.5'), {'phone': 3.0, 'report': 0.5})
+        with self.assertRaisesMessage(CommandError, "Weight of 'phone' must be a number"):
+            command.parse_mix('phone=lots')
+        with self.assertRaisesMessage(CommandError, "Unknown operation 'dial'"):
+            command.parse_mix('dial=1')
+
+    def test_recorder_summary(self):
+        recorder = Recorder()
+        for latency, status_code in ((10, 200), (20, 200), (30, 429), (40, None)):
+            recorder.record('phone', latency, status_code)
+        samples, position = recorder.since(0)
+        self.assertEqual(position, 4)
+        self.assertEqual(recorder.since(position), ([], 4))
+
+        summary = summarize(samples, 2)
+        self.assertEqual(summary['requests'], 4)
+        self.assertEqual(summary['throughput'], 2.0)
+        self.assertEqual((summary['errors'], summary['rejected']), (1, 1))
+        self.assertEqual(summary['p50'], 25.0)
@@ -0,0 +1,121 @@
+import random
+
+from rest_framework import throttling
+
+from .sharedstore import get_shared_store
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS throttle_window ('
+    ' key TEXT PRIMARY KEY,'
+    ' window INTEGER NOT NULL,'
+    ' current INTEGER NOT NULL,'
+    ' previous INTEGER NOT NULL,'
+    ' expires REAL NOT NULL'
+    ')'
+)
+
+# Roughly one check in this many also purges expired keys.
+PRUNE_EVERY = 1000
+
+
+class SlidingWindowThrottleMixin:
+    """
+    Sliding-window-counter replacement for ``SimpleRateThrottle``'s cache backend.
+
+    Each key keeps two counters (current and previous fixed window) instead of
+    a list of timestamps, so a check is O(1) regardless of the rate. The
+    request count is estimated as ``previous * (1 - elapsed) + current``.
+    State lives in the host-wide shared store, so limits hold across all
+    worker processes rather than being multiplied by the worker count.
+    """
+
+    def get_store(self):
+        store = get_shared_store()
+        store.register_schema(SCHEMA)
+        return store
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window, offset = divmod(self.now, self.duration)
+        window = int(window)
+        self.elapsed = offset / self.duration
+
+        with self.get_store().transaction() as conn:
+            row = conn.execute(
+                'SELECT window, current, previous FROM throttle_window WHERE key = ?',
+                (self.key,)
+            ).fetchone()
+            self.current, self.previous = self._roll(row, window)
+
+            if self._estimate() + 1 > self.num_requests:
+                return self.throttle_failure()
+
+            self.current += 1
+            conn.execute(
+                'INSERT INTO throttle_window (key, window, current, previous, expires) '
+                'VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET window = excluded.window, '
+                'current = excluded.current, previous = excluded.previous, '
+                'expires = excluded.expires',
+                (self.key, window, self.current, self.previous,
+                 (window + 2) * self.duration)
+            )
+            if random.randrange(PRUNE_EVERY) == 0:
+                conn.execute('DELETE FROM throttle_window WHERE expires < ?', (self.now,))
+        return self.throttle_success()
+
+    def throttle_success(self):
+        return True
+
+    def _roll(self, row, window):
+        if row is None:
+            return 0, 0
+        stored_window, current, previous = row
+        if stored_window == window:
+            return current, previous
+        if stored_window == window - 1:
+            return 0, current
+        return 0, 0
+
+    def _estimate(self):
+        return self.previous * (1 - self.elapsed) + self.current
+
+    def wait(self):
+        """Seconds until the estimated count drops low enough to admit one request."""
+        allowed = self.num_requests - 1
+        if self.current <= allowed:
+            if not self.previous:
+                return None
+            needed = 1 - (allowed - self.current) / self.previous
+            return max(needed - self.elapsed, 0) * self.duration
+
+        # Nothing more fits in this window; wait for the next one, where the
+        # current count becomes the decaying "previous" counter.
+        needed = 1 - allowed / self.current
+        return (1 - self.elapsed + needed) * self.duration
+
+
+class AnonRateThrottle(SlidingWindowThrottleMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class UserRateThrottle(SlidingWindowThrottleMixin, throttling.UserRateThrottle):
+    pass
+
+
+class ScopedRateThrottle(SlidingWindowThrottleMixin, throttling.ScopedRateThrottle):
+    pass
+
+
+def reset_throttles():
+    """Forget all throttle state (used by tests and after rate changes)."""
+    store = get_shared_store()
+    store.register_schema(SCHEMA)
+    store.execute('DELETE FROM throttle_window')
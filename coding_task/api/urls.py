@@ -2,7 +2,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenRefreshView
-from .views import UserViewSet, ContactViewSet, SpamReportViewSet, SearchView
+from .views import UserViewSet, ContactViewSet, SpamReportViewSet, SearchView, SuggestView, AddressBookSummaryView
 from .auth import CustomTokenObtainPairView
 
 router = DefaultRouter()
@@ -16,4 +16,6 @@ urlpatterns = [
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('auth/register/', UserViewSet.as_view({'post': 'create'}), name='register'),
     path('search/', SearchView.as_view(), name='search'),
+    path('search/suggest/', SuggestView.as_view(), name='search-suggest'),
+    path('me/summary/', AddressBookSummaryView.as_view(), name='me-summary'),
 ]
\ No newline at end of file
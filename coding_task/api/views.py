@@ -1,18 +1,33 @@
-from rest_framework import viewsets, status, generics
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework import viewsets, status, generics, serializers
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from django.db import transaction
+from django.db import IntegrityError
 from django.contrib.auth import get_user_model
-from django.db.models import F, Count, Q
+from django.db.models import Exists, F, Count, OuterRef, Q
 from .models import SpamReport, UserProfile, Contact
+from .feed import read_feed
+from .normalization import digits_only, normalize_name
+from .renderers import CompactFormatsMixin
+from .reports import record_spam_report
+from .scoring import likelihood, likelihoods, scoring_counts
+from .suggest import name_index
+from .sync import contact_changes
+from .summary import get_summary
+from .search import fuzzy_name_matches, phone_suffix_matches, saved_names, PHONE_SUFFIX_MIN_DIGITS
+from .singleflight import flight
 from .serializers import (
     UserRegistrationSerializer, 
     ContactSerializer, 
     SpamReportSerializer,
-    SearchResultSerializer
+    SearchResultSerializer,
+    SuggestionSerializer,
+    SpamFeedSerializer,
+    ContactChangesSerializer,
+    AddressBookSummarySerializer
 )
-from drf_spectacular.utils import extend_schema, extend_schema_view
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
 
 User = get_user_model()
 
@@ -48,26 +63,99 @@ class UserViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+CONTACT_LIST_PARAMETERS = [
+    OpenApiParameter('spam_reported', bool, description='Only contacts with this spam flag'),
+    OpenApiParameter('name', str, description='Name prefix (case-insensitive)'),
+    OpenApiParameter('phone', str, description='Phone number prefix'),
+    OpenApiParameter('ordering', str, enum=['id', '-id', 'name', '-name', 'phone_number', '-phone_number']),
+    OpenApiParameter('fields', str, description='Comma-separated fields to return, e.g. id,name'),
+]
+
 @extend_schema_view(
-    list=extend_schema(description='List all contacts for the authenticated user'),
+    list=extend_schema(
+        description='List all contacts for the authenticated user',
+        parameters=CONTACT_LIST_PARAMETERS
+    ),
     create=extend_schema(description='Create a new contact'),
     retrieve=extend_schema(description='Get a specific contact by ID'),
     update=extend_schema(description='Update a contact'),
     destroy=extend_schema(description='Delete a contact')
 )
-class ContactViewSet(viewsets.ModelViewSet):
+class ContactViewSet(CompactFormatsMixin, viewsets.ModelViewSet):
     serializer_class = ContactSerializer
     permission_classes = [IsAuthenticated]
-    
+    # Every ordering ends in id so pages are stable; each one is backed by an
+    # (owner, ..., id) index
+    orderings = {
+        'id': ['id'],
+        'name': ['name_normalized', 'id'],
+        'phone_number': ['phone_number', 'id'],
+    }
+
     def get_queryset(self):
-        return Contact.objects.filter(owner=self.request.user)
+        queryset = Contact.objects.filter(owner=self.request.user)
+        params = self.request.query_params
+
+        if 'spam_reported' in params:
+            queryset = queryset.filter(
+                spam_reported=serializers.BooleanField().to_internal_value(params['spam_reported'])
+            )
+        if params.get('name'):
+            queryset = queryset.filter(name_normalized__startswith=normalize_name(params['name']))
+        if params.get('phone'):
+            queryset = queryset.filter(phone_number__startswith=params['phone'].replace(' ', '+'))
+
+        ordering = params.get('ordering', 'id')
+        descending = ordering.startswith('-')
+        if ordering.lstrip('-') not in self.orderings:
+            raise ValidationError({'ordering': f"Choose from {', '.join(self.orderings)}, optionally prefixed with '-'"})
+        queryset = queryset.order_by(*(
+            f'-{field}' if descending else field for field in self.orderings[ordering.lstrip('-')]
+        ))
+
+        requested = ContactSerializer.requested_fields(self.request)
+        if requested is None and self.action == 'list':
+            # Only the listed columns, which the (owner, id) index covers. Not
+            # for instances that may be saved: save() writes loaded fields only
+            requested = ContactSerializer.Meta.fields
+        if requested:
+            queryset = queryset.only(*{
+                column for name in requested for column in ContactSerializer.source_fields[name]
+            })
+        return queryset
+
+    @extend_schema(
+        description='Contacts changed and deleted since a version, for incremental sync',
+        parameters=[
+            OpenApiParameter('since', int, description='Version returned by the previous sync; 0 for everything'),
+            OpenApiParameter('fields', str, description='Comma-separated fields to return, e.g. id,name'),
+        ],
+        responses={200: ContactChangesSerializer, 410: None}
+    )
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        GET /api/contacts/changes/?since=<version>
+
+        Returns the contacts inserted or updated (including spam flag
+        changes) and the ids deleted after ``since``. Continue from the
+        returned ``version``; 410 means it is too old and the client must
+        download the full list again.
+        """
+        try:
+            since = int(request.query_params.get('since', 0))
+        except ValueError:
+            raise ValidationError({'since': 'since must be an integer version'})
+        changes = contact_changes(request.user, since)
+        changes['changed'] = self.get_serializer(changes['changed'], many=True).data
+        return Response(changes)
 
 @extend_schema_view(
     list=extend_schema(description='List all spam reports by the user'),
     create=extend_schema(description='Report a number as spam'),
     retrieve=extend_schema(description='Get a specific spam report by ID')
 )
-class SpamReportViewSet(viewsets.ModelViewSet):
+class SpamReportViewSet(CompactFormatsMixin, viewsets.ModelViewSet):
     """
     API endpoint for spam reporting and checking.
     
@@ -108,27 +196,41 @@ class SpamReportViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        with transaction.atomic():
-            # Create spam report
-            report = SpamReport.objects.create(
-                reporter=request.user,
-                phone_number=phone_number
-            )
-
-           
-            Contact.objects.filter(phone_number=phone_number).update(
-                spam_reported=True
-            )
-
-            
-            UserProfile.objects.filter(phone_number=phone_number).update(
-                spam_count=F('spam_count') + 1
+        try:
+            report = record_spam_report(request.user, phone_number)
+        except IntegrityError:
+            # A concurrent request filed the same report first
+            return Response(
+                {'error': 'You have already reported this number'},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
         serializer = self.get_serializer(report)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-class SearchView(generics.GenericAPIView):
+    @extend_schema(
+        description='All spam reports in id order, for downstream consumers (staff only)',
+        parameters=[
+            OpenApiParameter('since', str, description='Cursor returned by the previous call; omit to start from the beginning'),
+            OpenApiParameter('wait', int, description='Seconds to wait for new reports when there are none (long poll)'),
+        ],
+        responses=SpamFeedSerializer
+    )
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser], pagination_class=None)
+    def feed(self, request):
+        """
+        GET /api/spam-reports/feed/?since=<cursor>&wait=20
+
+        Pass back the returned ``cursor`` to receive only later reports;
+        ``has_more`` means the next page is already available.
+        """
+        try:
+            wait = max(float(request.query_params.get('wait', 0)), 0)
+        except ValueError:
+            raise ValidationError({'wait': 'wait must be a number'})
+        return Response(read_feed(request.query_params.get('since'), wait))
+
+class SearchView(CompactFormatsMixin, generics.GenericAPIView):
     """
     API endpoint for searching the global database.
     
@@ -191,15 +293,23 @@ class SearchView(generics.GenericAPIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        if search_type.startswith('phone'):
+            # An unescaped '+' in the query string arrives as a space
+            query = query.replace(' ', '+').strip()
+
         if search_type == 'phone':
             return self._search_by_phone(query)
+        if search_type == 'phone_suffix':
+            return self._search_by_phone_suffix(query)
+        if search_type == 'fuzzy':
+            return self._search_by_fuzzy_name(query)
         return self._search_by_name(query)
 
     def _search_by_name(self, query):
         # Search in both registered users and contacts
         user_results = UserProfile.objects.filter(
             user__name__icontains=query
-        ).values('user__name', 'phone_number')
+        ).values('phone_number', name=F('user__name'))
         
         contact_results = Contact.objects.filter(
             name__icontains=query
@@ -210,84 +320,140 @@ class SearchView(generics.GenericAPIView):
         
         
         def sort_key(result):
-            name = result.get('user__name') or result.get('name')
+            name = result['name'] or ''
             if name.lower() == query.lower():
                 return (0, name)
             elif name.lower().startswith(query.lower()):
                 return (1, name)
             return (2, name)
         
-        return sorted(all_results, key=sort_key)
+        return Response(sorted(all_results, key=sort_key))
+
+    def _search_by_fuzzy_name(self, query):
+        matches = fuzzy_name_matches(query)
+        if not matches:
+            return Response([])
+        # Labelled and shown like phone search results
+        return Response(self._with_visible_emails(self._format_search_results(matches)))
 
     def _search_by_phone(self, query):
-     
+        # Identical lookups share one run (see singleflight.py): a number that
+        # suddenly calls everyone is searched by thousands at the same moment
+        data = flight(f'search:phone:{query}', lambda: self._phone_lookup(query))
+        if isinstance(data, list) and any('email' in result for result in data):
+            data = self._with_visible_emails(data)
+        return Response(data)
+
+    def _phone_lookup(self, query):
+        """The phone search response as every user sees it; emails are added per user."""
         try:
             user_profile = UserProfile.objects.get(phone_number=query)
            
-            return Response([{
+            return [{
                 'name': user_profile.user.name,
                 'phone_number': query,
                 'is_registered': True,
-                'spam_likelihood': self._get_spam_likelihood(
-                    SpamReport.objects.filter(phone_number=query).count()
-                )
-            }])
+                'spam_likelihood': likelihood(query),
+                'email': None,
+            }]
         except UserProfile.DoesNotExist:
-            contacts = Contact.objects.filter(
-                phone_number=query
-            ).values('name', 'phone_number').annotate(
-                contact_count=Count('name')  # Count how many users have this contact
-            ).distinct()
-            return Response(self._format_search_results(contacts))
+            names = saved_names(query)
+            if not names and scoring_counts([query])[0] > 0:
+                # Nobody saved the number, but it or its range has been reported
+                names = [{'name': None, 'phone_number': query, 'contact_count': 0}]
+            return self._format_search_results(names)
+
+    def _search_by_phone_suffix(self, query):
+        if len(digits_only(query)) < PHONE_SUFFIX_MIN_DIGITS:
+            return Response(
+                {'error': f'At least {PHONE_SUFFIX_MIN_DIGITS} digits are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = phone_suffix_matches(query)
+        # Scored like every other search: thresholds, reporter weights and range priors
+        labels = likelihoods([result['phone_number'] for result in results])
+        for result, label in zip(results, labels):
+            result['spam_likelihood'] = label
+        return Response(results)
 
     def _format_search_results(self, contacts):
         if not contacts:
-            return Response({
+            return {
                 'message': 'No results found',
                 'results': []
-            }, status=status.HTTP_200_OK)
-        
+            }
+
+        numbers = list({contact['phone_number'] for contact in contacts})
+        spam_likelihoods = dict(zip(numbers, likelihoods(numbers)))
+        registered = set(
+            UserProfile.objects.filter(phone_number__in=numbers).values_list('phone_number', flat=True)
+        )
+
         results = []
         for contact in contacts:
-           
-            try:
-                profile = UserProfile.objects.get(phone_number=contact['phone_number'])
-                 
-                email = None
-                if Contact.objects.filter(
-                    owner=profile.user,
-                    phone_number=self.request.user.profile.phone_number
-                ).exists():
-                    email = profile.email
-            except UserProfile.DoesNotExist:
-                email = None
-
             results.append({
                 'name': contact['name'],
                 'phone_number': contact['phone_number'],
-                'spam_likelihood': self._get_spam_likelihood(
-                    SpamReport.objects.filter(phone_number=contact['phone_number']).count()
-                ),
-                'email': email,
-                'is_registered': profile is not None if 'profile' in locals() else False,
+                'spam_likelihood': spam_likelihoods[contact['phone_number']],
+                'email': None,
+                'is_registered': contact['phone_number'] in registered,
                 'contact_count': contact.get('contact_count', 1)
             })
         return results
 
-    def _get_spam_likelihood(self, count: int) -> str:
-        if count > 5:
-            return "Very High"
-        elif count > 2:
-            return "High"
-        elif count > 0:
-            return "Medium"
-        return "Low"
-
-    def _get_email_if_allowed(self, user_profile, requesting_user):
-        """Only show email if requesting user is in the person's contacts"""
-        if Contact.objects.filter(
-            owner=user_profile.user,
-            phone_number=requesting_user.profile.phone_number
-        ).exists():
-            return user_profile.email
-        return None
\ No newline at end of file
+    def _with_visible_emails(self, results):
+        """
+        ``results`` with the emails of registered users the requesting user
+        may see: those who share a contact with the requester, in either
+        direction (they saved the requester, or the requester saved them).
+        """
+        registered = [result['phone_number'] for result in results if result['is_registered']]
+        if not registered:
+            return results
+        requester = self.request.user
+        emails = dict(
+            UserProfile.objects.filter(phone_number__in=registered).filter(
+                Exists(Contact.objects.filter(owner=OuterRef('user'), phone_number=requester.profile.phone_number))
+                | Exists(Contact.objects.filter(owner=requester, phone_number=OuterRef('phone_number')))
+            ).values_list('phone_number', 'email')
+        )
+        return [{**result, 'email': emails.get(result['phone_number'])} for result in results]
+
+class SuggestView(generics.GenericAPIView):
+    """
+    Name completions for the search box, most popular first.
+
+    GET /api/search/suggest/?q=jo&limit=10
+
+    Served from an in-process prefix index, so no database query is made
+    per keystroke.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = SuggestionSerializer
+    max_limit = 50
+
+    def get(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), self.max_limit)
+        except ValueError:
+            return Response(
+                {'error': 'limit must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(name_index.suggest(request.query_params.get('q', ''), limit))
+
+class AddressBookSummaryView(generics.GenericAPIView):
+    """
+    The requesting user's address-book totals for the home screen.
+
+    GET /api/me/summary/
+
+    Read from one counter row kept up to date as contacts, spam flags and
+    reports change, instead of from the contact list.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = AddressBookSummarySerializer
+
+    def get(self, request):
+        return Response(self.get_serializer(get_summary(request.user.id)).data)
@@ -2,7 +2,6 @@ import os
 from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
-import dj_database_url
 
 load_dotenv()
 
@@ -31,6 +30,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'coding_task.api.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -44,8 +44,8 @@ REST_FRAMEWORK = {
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'coding_task.api.throttling.AnonRateThrottle',
+        'coding_task.api.throttling.UserRateThrottle'
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/minute',
@@ -56,6 +56,24 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20
 }
 
+# Spam likelihood labels. POLICY is 'absolute' (report count), 'relative'
+# (reports as a % of registered users) or a dotted path to a ThresholdPolicy.
+SPAM_SCORING = {
+    'POLICY': 'absolute',
+    'THRESHOLDS': None,  # policy defaults
+    'POPULATION_TTL': 300,  # seconds between registered-user recounts
+    'RANGE_PRIOR': True,  # unreported numbers inherit their number range's reports
+}
+
+# In-process name autocomplete index behind /api/search/suggest/
+NAME_SUGGEST = {
+    'MAX_ENTRIES': 200000,  # memory budget, least popular names are dropped
+    'REFRESH_SECONDS': 30,  # merge newly created contacts/users
+    'REBUILD_SECONDS': 3600,  # full rebuild when no ARTIFACT_PATH file exists
+    # Written by `manage.py build_name_index`; defaults to BASE_DIR/name_index.json
+    'ARTIFACT_PATH': None,
+}
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
@@ -78,6 +96,25 @@ TEMPLATES = [
     },
 ]
 
+# Host-local SQLite file shared by all worker processes (throttle counters,
+# single-flight leases).
+SHARED_STORE_PATH = os.getenv('SHARED_STORE_PATH', str(BASE_DIR / 'shared_store.sqlite3'))
+
+# Identical concurrent phone searches share one lookup (api/singleflight.py);
+# only callers that arrive while it runs get its result.
+SINGLE_FLIGHT = {
+    'ENABLED': True,
+    'LOCK_TIMEOUT': 2.0,  # seconds before another worker or thread stops waiting for a stalled lookup
+    'RESULT_TTL': 0,  # seconds to also serve the result to later lookups (may be stale)
+}
+
+# Written by `manage.py generate_schema` at deploy time and served at /schema/.
+SCHEMA_ARTIFACT_PATH = os.getenv('SCHEMA_ARTIFACT_PATH', str(BASE_DIR / 'schema.json'))
+
+# Memory-mapped spam-count snapshot written by `manage.py build_spam_snapshot`
+SPAM_SNAPSHOT_ENABLED = os.getenv('SPAM_SNAPSHOT_ENABLED', 'False').lower() == 'true'
+SPAM_SNAPSHOT_PATH = os.getenv('SPAM_SNAPSHOT_PATH', str(BASE_DIR / 'spam_snapshot.bin'))
+
 WSGI_APPLICATION = 'coding_task.wsgi.application'
 
 DATABASES = {
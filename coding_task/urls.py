@@ -1,17 +1,29 @@
 # coding_task/urls.py
 from django.contrib import admin
 from django.urls import path, include
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularRedocView,
-    SpectacularSwaggerView,
-)
+from django.utils.module_loading import import_string
 
+
+def lazy_view(dotted_path, **initkwargs):
+    """Import a class-based view on its first request instead of at URLconf load."""
+    view = None
+
+    def wrapper(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(dotted_path).as_view(**initkwargs)
+        return view(request, *args, **kwargs)
+
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+# Schema and docs views pull in drf_spectacular's generator and renderers,
+# which no API request needs, so they are imported on first use only.
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('coding_task.api.urls')),
-    path('schema/', SpectacularAPIView.as_view(), name='schema'),
-    path('', SpectacularRedocView.as_view(url='/schema/'), name='redoc'),
-    path('swagger/', SpectacularSwaggerView.as_view(url='/schema/'), name='swagger-ui'),
+    path('schema/', lazy_view('coding_task.api.schema.CachedSchemaView'), name='schema'),
+    path('', lazy_view('drf_spectacular.views.SpectacularRedocView', url='/schema/'), name='redoc'),
+    path('swagger/', lazy_view('drf_spectacular.views.SpectacularSwaggerView', url='/schema/'), name='swagger-ui'),
 ]
-
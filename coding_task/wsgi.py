@@ -5,4 +5,9 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'coding_task.settings.base')
 
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# Loads the index written by build_name_index, without querying the database
+from coding_task.api.suggest import name_index  # noqa: E402
+
+name_index.warm()
\ No newline at end of file